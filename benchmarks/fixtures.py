@@ -0,0 +1,87 @@
+from random import Random
+from time import time
+
+
+# Синтетические данные в формате ответов PVU API
+
+def make_address(rng: Random) -> str:
+    return "0x" + "".join(rng.choice("0123456789abcdef") for _ in range(40))
+
+
+def make_object_id(rng: Random) -> str:
+    return "".join(rng.choice("0123456789abcdef") for _ in range(24))
+
+
+def make_slot_data(
+        rng: Random,
+        land_id: str,
+        owner_id: str,
+        location: tuple[int, int],
+        crow_chance: float = 0.3,
+        water_chance: float = 0.3,
+        now_ms: int | None = None,
+) -> dict:
+    now_ms = now_ms if now_ms is not None else int(time() * 1000)
+    slot_data = {
+        "_id": make_object_id(rng),
+        "landId": land_id,
+        "location": list(location),
+        "type": rng.choice((1, 2)),
+        "status": 1,
+        "ownerId": owner_id,
+        "actionInfos": {
+            "isHaveCrow": rng.random() < crow_chance,
+            "isNeedWater": rng.random() < water_chance,
+            "lastCrowTime": now_ms - rng.randint(0, 3_600_000),
+            "lastWaterTime": now_ms - rng.randint(0, 3_600_000),
+            "totalCrowTime": rng.randint(0, 20),
+            "totalWaterTime": rng.randint(0, 20),
+        },
+    }
+    # Часть растений уже созрела, часть созреет позже
+    if rng.random() < 0.8:
+        slot_data["harvestTime"] = now_ms + rng.randint(-3_600_000, 86_400_000)
+    if rng.random() < 0.1:
+        slot_data["decoEffects"] = {"isGoodCrow": rng.random() < 0.5}
+    return slot_data
+
+
+def make_land_data(land_id: str, location: tuple[int, int], number_slots: int) -> dict:
+    return {"_id": land_id, "location": list(location), "numberSlots": number_slots}
+
+
+def make_user_data(
+        address: str,
+        le_amount: int = 10_000,
+        chase_crow_tools: int = 0,
+        watering_tools: int = 0,
+) -> dict:
+    return {
+        "publicAddress": address,
+        "leAmount": le_amount,
+        "chaseCrowTools": chase_crow_tools,
+        "wateringTools": watering_tools,
+        "numberOfBoxchainTickets": 0,
+        "numberOfLotteryTickets": 0,
+        "numberOfSeeds": 0,
+    }
+
+
+def make_reward_data(rng: Random) -> list[dict]:
+    rewards = [{"name": "le", "amount": rng.randint(1, 20)}]
+    for name in ("seed", "ticket", "water", "chase_crow"):
+        if rng.random() < 0.1:
+            rewards.append({"name": name, "amount": 1})
+    return rewards
+
+
+def make_slots_response(rng: Random, number_slots: int, owner_id: str | None = None) -> dict:
+    # Ответ get-by-coordinate для одной земли с number_slots слотами
+    land_id = make_object_id(rng)
+    owner_id = owner_id or make_address(rng)
+    now_ms = int(time() * 1000)
+    slots = [
+        make_slot_data(rng, land_id, owner_id, (i % 10, i // 10), now_ms=now_ms)
+        for i in range(number_slots)
+    ]
+    return {"status": 0, "data": [{"_id": land_id, "slots": slots}]}
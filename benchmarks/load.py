@@ -0,0 +1,153 @@
+# Нагрузочный тест: один цикл обработки всех аккаунтов воркером против локальной заглушки API.
+#
+#   python -m benchmarks.load --accounts 10 100 1000
+#   python -m benchmarks.load --accounts 100 --trace trace.json
+#   python -m benchmarks.load --accounts 100 --throttle-rps 200 --proxies 4 --dead-proxies 1
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+from statistics import quantiles
+from tempfile import TemporaryDirectory
+
+from bot.logger import logger
+from bot.pvu_api import AuthToken, PVUClient
+from bot.scheduler import Scheduler
+from bot.state_store import StateStore
+from bot.tracing import tracer
+from bot.worker import process_accounts
+from benchmarks.stub_server import PVUStubServer
+from benchmarks.proxy_server import StandInProxy
+
+
+def percentile(values: list[float], percent: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+async def run_load(accounts: int, args: argparse.Namespace) -> dict:
+    server = PVUStubServer(
+        accounts=accounts,
+        lands_per_account=args.lands,
+        slots_per_land=args.slots,
+        latency=tuple(args.latency),
+        error_rate=args.error_rate,
+        throttle_rps=args.throttle_rps,
+        shared_lands=args.shared_lands,
+    )
+    base_url = await server.start()
+    # Локальные прокси, а также адреса, на которых никто не слушает: их бот должен исключить
+    stand_in_proxies = [StandInProxy(f"proxy-{i}") for i in range(args.proxies)]
+    proxies = [await proxy.start() for proxy in stand_in_proxies]
+    for _ in range(args.dead_proxies):
+        dead_proxy = StandInProxy("dead")
+        proxies.append(await dead_proxy.start())
+        await dead_proxy.stop()
+    tokens = [AuthToken(token) for token in server.tokens]
+    scheduler = Scheduler()
+    # У каждого прогона свое состояние: прогоны не должны влиять друг на друга
+    state_dir = TemporaryDirectory()
+    state_store = StateStore(Path(state_dir.name) / "state.sqlite3")
+    state_store.open()
+    try:
+        async with PVUClient(
+                base_url,
+                global_rate=(args.rate, args.rate),
+                account_rate=(args.account_rate, args.account_rate),
+                proxies=proxies,
+        ) as client:
+            summaries = []
+            for _ in range(args.cycles):
+                # В трассировку, как и в отчет, идет последний цикл
+                tracer.clear()
+                requests_before = server.stats["requests"]
+                summary = await process_accounts(
+                    client, scheduler, state_store, [(token, None) for token in tokens], concurrency=args.concurrency)
+                await state_store.flush()
+                summaries.append((summary, server.stats["requests"] - requests_before))
+    finally:
+        await server.stop()
+        for proxy in stand_in_proxies:
+            await proxy.stop()
+        state_store.close()
+        state_dir.cleanup()
+
+    if stand_in_proxies:
+        print(f"Запросов через прокси ({accounts} аккаунтов): "
+              + ", ".join(f"{proxy.name}: {proxy.stats['requests']}" for proxy in stand_in_proxies))
+
+    if args.trace is not None:
+        trace_file = args.trace.with_name(f"{args.trace.stem}_{accounts}{args.trace.suffix}")
+        tracer.export(trace_file)
+        print_phases(accounts, tracer.report())
+        print(f"Трассировка: {trace_file}\n")
+
+    # Берем последний цикл: в первом покупаются инструменты и собираются накопившиеся награды
+    summary, requests = summaries[-1]
+    return {
+        "accounts": accounts,
+        "elapsed": summary.elapsed,
+        "requests": requests,
+        "rps": requests / summary.elapsed if summary.elapsed else 0.0,
+        "failed": summary.failed,
+        "p50": percentile(summary.account_latencies, 50),
+        "p95": percentile(summary.account_latencies, 95),
+        "max": max(summary.account_latencies, default=0.0),
+        "throttled": server.stats["throttled"],
+        "errors": server.stats["errors"],
+    }
+
+
+def print_phases(accounts: int, rows: list[tuple[str, int, float, float, float, float]]):
+    print(f"Фазы последнего цикла, аккаунтов: {accounts}")
+    header = f"{'phase':<20} {'calls':>7} {'total, s':>9} {'p50, s':>7} {'p95, s':>7} {'max, s':>7}"
+    print(header)
+    print("-" * len(header))
+    for name, calls, total, p50, p95, maximum in rows:
+        print(f"{name:<20} {calls:>7} {total:>9.2f} {p50:>7.3f} {p95:>7.3f} {maximum:>7.3f}")
+
+
+def print_report(results: list[dict]):
+    header = (
+        f"{'accounts':>8} {'cycle, s':>9} {'requests':>9} {'req/s':>8} {'failed':>7}"
+        f" {'p50, s':>7} {'p95, s':>7} {'max, s':>7} {'429':>6} {'5xx':>6}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['accounts']:>8} {r['elapsed']:>9.2f} {r['requests']:>9} {r['rps']:>8.1f} {r['failed']:>7}"
+            f" {r['p50']:>7.3f} {r['p95']:>7.3f} {r['max']:>7.3f} {r['throttled']:>6} {r['errors']:>6}"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест воркера на локальной заглушке PVU API")
+    parser.add_argument("--accounts", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--lands", type=int, default=2, help="Земель на аккаунт")
+    parser.add_argument("--slots", type=int, default=10, help="Слотов на землю")
+    parser.add_argument("--shared-lands", type=int, default=0, help="Общих земель, на которых растения всех аккаунтов")
+    parser.add_argument("--cycles", type=int, default=2, help="Циклов на каждый прогон, в отчет идет последний")
+    parser.add_argument("--concurrency", type=int, default=100, help="Одновременно обрабатываемых аккаунтов")
+    parser.add_argument("--rate", type=float, default=10_000, help="Общее ограничение запросов в секунду")
+    parser.add_argument("--account-rate", type=float, default=1_000, help="Ограничение запросов в секунду на аккаунт")
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.01, 0.05), metavar=("MIN", "MAX"))
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rps", type=float, default=None, help="Ограничение запросов в секунду для каждого IP (прокси)")
+    parser.add_argument("--proxies", type=int, default=0, help="Сколько локальных прокси запустить")
+    parser.add_argument("--dead-proxies", type=int, default=0, help="Сколько недоступных прокси добавить")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--trace", type=Path, default=None, help="Файл трассировки последнего цикла каждого прогона")
+    args = parser.parse_args()
+    tracer.enabled = args.trace is not None
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    results = [await run_load(accounts, args) for accounts in args.accounts]
+    print_report(results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+# Микробенчмарки разбора ответов API: Slot, User, Reward, список земель и handle_response_data.
+# Сравнивает результаты с сохраненным базовым уровнем и завершается с кодом 1 при регрессии.
+#
+#   python -m benchmarks.parsing                  # прогон и сравнение с базовым уровнем
+#   python -m benchmarks.parsing --save-baseline  # прогон и сохранение нового базового уровня
+import argparse
+import json
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+from random import Random
+from typing import Callable
+
+from bot.pvu_api.models import Slot, User, Reward, Land
+from bot.pvu_api.pvu_api import handle_response_data
+from bot.pvu_api._json import loads, dumps, JSON_BACKEND
+from benchmarks.fixtures import make_slots_response, make_user_data, make_reward_data, make_land_data
+from benchmarks.fixtures import make_address, make_object_id
+
+
+BASELINE_JSON = Path(__file__).parent / "parsing_baseline.json"
+SIZES = (1, 10, 100, 1000, 10_000)
+SEED = 0
+
+
+def build_cases() -> dict[str, Callable[[], object]]:
+    rng = Random(SEED)
+    cases = {}
+
+    user_data = make_user_data(make_address(rng))
+    cases["User.from_pvu_user_data"] = lambda: User.from_pvu_user_data(user_data)
+
+    reward_data = make_reward_data(rng) + [{"name": "seed", "amount": 1}, {"name": "water", "amount": 2}]
+    cases["Reward.from_pvu_reward_data"] = lambda: Reward.from_pvu_reward_data(reward_data)
+
+    for size in SIZES:
+        response = make_slots_response(rng, size)
+        slots_data = response["data"][0]["slots"]
+        raw_response = dumps(response)
+        lands_data = [make_land_data(make_object_id(rng), (i, 0), 20) for i in range(size)]
+
+        cases[f"Slot.from_pvu_slot_data[{size}]"] = (
+            lambda slots_data=slots_data: [Slot.from_pvu_slot_data(slot_data) for slot_data in slots_data]
+        )
+        cases[f"Land.from_pvu_land_data[{size}]"] = (
+            lambda lands_data=lands_data: [Land.from_pvu_land_data(land_data) for land_data in lands_data]
+        )
+        cases[f"handle_response_data[{size}]"] = (
+            lambda response=response: handle_response_data(response)
+        )
+        # Полный путь get_slots_by_location: декодирование байтов ответа и создание моделей
+        cases[f"get-by-coordinate[{size}]"] = (
+            lambda raw_response=raw_response: [
+                Slot.from_pvu_slot_data(slot_data)
+                for slot_data in handle_response_data(loads(raw_response))[0]["slots"]
+            ]
+        )
+    return cases
+
+
+def measure(func: Callable[[], object], min_time: float, repeat: int) -> dict:
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    while elapsed < min_time:
+        number *= 2
+        elapsed = timer.timeit(number)
+    # Лучший из нескольких замеров меньше всего зависит от фоновой нагрузки
+    elapsed = min(elapsed, *timer.repeat(repeat=repeat - 1, number=number)) if repeat > 1 else elapsed
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"ops_per_sec": number / elapsed, "peak_bytes": peak}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        if result["ops_per_sec"] < base["ops_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result['ops_per_sec']:.0f} ops/s против {base['ops_per_sec']:.0f} ops/s в базовом уровне")
+        if result["peak_bytes"] > base["peak_bytes"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {result['peak_bytes']} байт против {base['peak_bytes']} байт в базовом уровне")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки разбора ответов PVU API")
+    parser.add_argument("--save-baseline", action="store_true", help="Сохранить результаты как базовый уровень")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_JSON)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Допустимое отклонение от базового уровня")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Минимальное время замера одного случая, сек.")
+    parser.add_argument("--repeat", type=int, default=5, help="Количество замеров, берется лучший")
+    parser.add_argument("--filter", default="", help="Запускать только случаи, содержащие эту строку")
+    args = parser.parse_args()
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    results = {}
+    print(f"JSON: {JSON_BACKEND}")
+    print(f"{'case':<40} {'ops/s':>12} {'peak, KiB':>10} {'vs baseline':>12}")
+    for name, func in build_cases().items():
+        if args.filter not in name:
+            continue
+        result = results[name] = measure(func, args.min_time, args.repeat)
+        change = ""
+        if name in baseline:
+            change = f"{result['ops_per_sec'] / baseline[name]['ops_per_sec'] - 1:+.0%}"
+        print(f"{name:<40} {result['ops_per_sec']:>12.1f} {result['peak_bytes'] / 1024:>10.1f} {change:>12}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({**baseline, **results}, indent=2, sort_keys=True) + "\n")
+        print(f"Базовый уровень сохранен в {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nРегрессии производительности:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Локальный HTTP-прокси для проверки работы бота через прокси.
+# Пересылает запросы к заглушке API и добавляет заголовок X-Forwarded-For со своим именем,
+# чтобы заглушка различала прокси и ограничивала частоту запросов для каждого отдельно.
+#
+# Запуск отдельным процессом:
+#   python -m benchmarks.proxy_server --port 8081
+# и строка 127.0.0.1:8081 в input/proxies.txt
+import argparse
+import asyncio
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+
+
+# Заголовки, которые относятся к соединению с прокси, а не к самому запросу
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "proxy-authorization", "proxy-connection", "transfer-encoding", "host"}
+
+
+class StandInProxy:
+    def __init__(self, name: str):
+        self.name = name
+        self.stats: Counter = Counter()
+        self.app = web.Application()
+        self.app.router.add_route("*", "/{tail:.*}", self.forward)
+        self._session: aiohttp.ClientSession | None = None
+        self._runner: web.AppRunner | None = None
+
+    async def forward(self, request: web.Request) -> web.Response:
+        # Прокси получает запрос с полным адресом: http://host:port/path?query
+        self.stats["requests"] += 1
+        headers = {key: value for key, value in request.headers.items() if key.lower() not in HOP_BY_HOP_HEADERS}
+        headers["X-Forwarded-For"] = self.name
+        async with self._session.request(
+                request.method, request.url, headers=headers, data=await request.read(),
+        ) as response:
+            return web.Response(
+                status=response.status,
+                body=await response.read(),
+                content_type=response.content_type,
+            )
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._session = aiohttp.ClientSession()
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+        if self._session is not None:
+            await self._session.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Локальный HTTP-прокси")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    proxy = StandInProxy(f"proxy-{args.port}")
+    url = await proxy.start(args.host, args.port)
+    print(f"Прокси запущен: {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await proxy.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+# Время запуска: замер импорта модулей бота через python -X importtime в отдельных процессах.
+# Завершается с кодом 1, если при запуске импортируются тяжелые библиотеки,
+# которые должны загружаться лениво, или если импорт дольше допустимого.
+#
+#   python -m benchmarks.startup
+#   python -m benchmarks.startup --budget-ms 300 --top 20
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+
+BASE_DIR = Path(__file__).parent.parent
+MODULES = ("bot.worker", "bot.coordinator")
+# Библиотеки, которые импортируются только при первом использовании
+LAZY_MODULES = ("web3", "eth_account", "eth_keys", "aiohttp")
+
+
+def import_times(module: str) -> dict[str, int]:
+    # Накопленное время импорта каждого модуля в микросекундах
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def measure(module: str, repeat: int) -> dict[str, int]:
+    # Берется самый быстрый запуск: остальные искажены шумом и холодным кешем диска
+    return min((import_times(module) for _ in range(repeat)), key=lambda times: times[module])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер времени импорта модулей бота")
+    parser.add_argument("--repeat", type=int, default=5, help="Количество запусков, берется лучший")
+    parser.add_argument("--budget-ms", type=float, default=500, help="Допустимое время импорта одного модуля, мс")
+    parser.add_argument("--top", type=int, default=10, help="Сколько самых долгих импортов показать")
+    args = parser.parse_args()
+
+    problems = []
+    for module in MODULES:
+        times = measure(module, args.repeat)
+        total_ms = times[module] / 1000
+        print(f"{module}: {total_ms:.1f} мс")
+        heaviest = sorted(((us, name) for name, us in times.items() if name != module), reverse=True)
+        for us, name in heaviest[:args.top]:
+            print(f"  {us / 1000:>8.1f} мс  {name}")
+
+        lazy_imported = sorted({name for name in times if name.split(".")[0] in LAZY_MODULES})
+        if lazy_imported:
+            problems.append(f"{module}: при импорте загружаются {', '.join(lazy_imported)}")
+        if total_ms > args.budget_ms:
+            problems.append(f"{module}: импорт занимает {total_ms:.1f} мс при допустимых {args.budget_ms:.0f} мс")
+
+    if problems:
+        print("\nРегрессии времени запуска:")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+# Локальная заглушка PVU API для нагрузочного тестирования.
+# Эмулирует все методы API, которые использует bot/pvu_api/pvu_api.py,
+# с настраиваемыми задержкой, долей ошибок и троттлингом.
+#
+# Запуск отдельным процессом:
+#   python -m benchmarks.stub_server --accounts 100 --port 8080 --tokens-file input/tokens.txt
+# и API_BASE_URL = "http://127.0.0.1:8080" в bot/config.py
+import argparse
+import asyncio
+from collections import Counter, deque
+from pathlib import Path
+from random import Random
+from time import monotonic, time
+
+from aiohttp import web
+
+from benchmarks.fixtures import make_address, make_object_id, make_slot_data, make_land_data
+from benchmarks.fixtures import make_user_data, make_reward_data
+
+
+TOOL_PRICE = 10
+
+
+class StubAccount:
+    def __init__(self, address: str, token: str):
+        self.address = address
+        self.token = token
+        self.user_data = make_user_data(address)
+        self.lands: list[dict] = []
+
+
+class PVUStubServer:
+    def __init__(
+            self,
+            accounts: int = 10,
+            lands_per_account: int = 2,
+            slots_per_land: int = 10,
+            latency: tuple[float, float] = (0.0, 0.0),
+            error_rate: float = 0.0,
+            throttle_rps: float | None = None,
+            churn: float = 0.2,
+            seed: int = 0,
+            shared_lands: int = 0,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rps = throttle_rps
+        self.churn = churn
+        self.rng = Random(seed)
+        self.stats: Counter = Counter()
+        # Недавние запросы по источникам: запросы через прокси ограничиваются для каждого прокси отдельно
+        self._recent_requests: dict[str, deque[float]] = {}
+        self._nonces: dict[str, int] = {}
+
+        self.accounts_by_token: dict[str, StubAccount] = {}
+        self.accounts_by_address: dict[str, StubAccount] = {}
+        self.lands_by_location: dict[tuple[int, int], dict] = {}
+        self.slots_by_id: dict[str, dict] = {}
+        for i in range(accounts):
+            account = self.add_account(make_address(self.rng))
+            for j in range(lands_per_account):
+                self.add_land([account], (i, j), slots_per_land)
+        # Общие земли: на них растения всех аккаунтов, как при PROCESS_ONLY_MY_PLANTS = False
+        for j in range(shared_lands):
+            self.add_land(list(self.accounts_by_token.values()), (-1, j), slots_per_land)
+
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.router.add_get("/users/login", self.login)
+        self.app.router.add_post("/users/auth", self.auth)
+        self.app.router.add_get("/users/userInfo", self.user_info)
+        self.app.router.add_get("/lands/my-assets/my-slots", self.my_slots)
+        self.app.router.add_get("/lands/get-by-coordinate", self.get_by_coordinate)
+        self.app.router.add_post("/shops/buy-tools", self.buy_tools)
+        self.app.router.add_post("/farms/water-plant", self.water_plant)
+        self.app.router.add_post("/farms/chase-crow", self.chase_crow)
+        self.app.router.add_post("/farms/chase-good-crow", self.chase_good_crow)
+        self.app.router.add_post("/farms/harvest-plant", self.harvest_plant)
+        self._runner: web.AppRunner | None = None
+
+    # -- Синтетические данные
+
+    def add_account(self, address: str) -> StubAccount:
+        account = StubAccount(address, make_object_id(self.rng) + make_object_id(self.rng))
+        self.accounts_by_token[account.token] = account
+        self.accounts_by_address[address] = account
+        return account
+
+    def add_land(self, accounts: list[StubAccount], location: tuple[int, int], number_slots: int):
+        # Растения на земле принадлежат аккаунтам по очереди
+        land_id = make_object_id(self.rng)
+        land = make_land_data(land_id, location, number_slots)
+        land["slots"] = [
+            make_slot_data(self.rng, land_id, accounts[k % len(accounts)].address, (k % 10, k // 10))
+            for k in range(number_slots)
+        ]
+        for slot in land["slots"]:
+            self.slots_by_id[slot["_id"]] = slot
+        for account in accounts:
+            account.lands.append(land)
+        self.lands_by_location[location] = land
+
+    @property
+    def tokens(self) -> list[str]:
+        return list(self.accounts_by_token)
+
+    # -- Эмуляция задержки, ошибок и троттлинга
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.stats["requests"] += 1
+        self.stats[f"requests:{request.path}"] += 1
+        if self.latency[1] > 0:
+            await asyncio.sleep(self.rng.uniform(*self.latency))
+        if self.throttle_rps is not None:
+            now = monotonic()
+            recent_requests = self._recent_requests.setdefault(request.headers.get("X-Forwarded-For", ""), deque())
+            while recent_requests and recent_requests[0] < now - 1:
+                recent_requests.popleft()
+            if len(recent_requests) >= self.throttle_rps:
+                self.stats["throttled"] += 1
+                return web.Response(status=429)
+            recent_requests.append(now)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=503)
+        return await handler(request)
+
+    @staticmethod
+    def ok(data) -> web.Response:
+        return web.json_response({"status": 0, "data": data})
+
+    @staticmethod
+    def fail(status: int, msg: str) -> web.Response:
+        return web.json_response({"status": status, "data": msg})
+
+    def _account(self, request: web.Request) -> StubAccount:
+        authorization = request.headers.get("authorization", "")
+        token = authorization.split()[-1] if authorization else ""
+        if token not in self.accounts_by_token:
+            raise web.HTTPUnauthorized()
+        return self.accounts_by_token[token]
+
+    # -- Методы API
+
+    async def login(self, request: web.Request) -> web.Response:
+        address = request.query["publicAddress"]
+        nonce = self.rng.randint(100_000, 999_999)
+        self._nonces[address] = nonce
+        return self.ok({"nonce": nonce})
+
+    async def auth(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        address = payload["publicAddress"]
+        if address not in self._nonces or not payload.get("signature"):
+            return self.fail(4, "Invalid signature")
+        del self._nonces[address]
+        account = self.accounts_by_address.get(address) or self.add_account(address)
+        # Перевыпуск токена: старый перестает действовать
+        del self.accounts_by_token[account.token]
+        account.token = make_object_id(self.rng) + make_object_id(self.rng)
+        self.accounts_by_token[account.token] = account
+        return self.ok({"token": account.token})
+
+    async def user_info(self, request: web.Request) -> web.Response:
+        return self.ok(self._account(request).user_data)
+
+    async def my_slots(self, request: web.Request) -> web.Response:
+        account = self._account(request)
+        return self.ok([
+            make_land_data(land["_id"], land["location"], land["numberSlots"])
+            for land in account.lands
+        ])
+
+    async def get_by_coordinate(self, request: web.Request) -> web.Response:
+        self._account(request)
+        location = (int(request.query["x"]), int(request.query["y"]))
+        land = self.lands_by_location.get(location)
+        if land is None:
+            return self.fail(3, "Land not found")
+        # Со временем у растений снова появляются вороны и потребность в воде
+        for slot in land["slots"]:
+            if self.rng.random() < self.churn:
+                slot["actionInfos"]["isHaveCrow"] = True
+            if self.rng.random() < self.churn:
+                slot["actionInfos"]["isNeedWater"] = True
+        return self.ok([{"_id": land["_id"], "slots": land["slots"]}])
+
+    async def buy_tools(self, request: web.Request) -> web.Response:
+        account = self._account(request)
+        payload = await request.json()
+        quantity = payload["quantity"]
+        user_data = account.user_data
+        if user_data["leAmount"] < quantity * TOOL_PRICE:
+            return self.fail(5, "Not enough LE")
+        user_data["leAmount"] -= quantity * TOOL_PRICE
+        tool_field = "chaseCrowTools" if payload["toolType"] == 1 else "wateringTools"
+        user_data[tool_field] += quantity
+        return self.ok({})
+
+    def _reward(self, account: StubAccount) -> list[dict]:
+        # Награды зачисляются на аккаунт, как это делает настоящий API
+        rewards = make_reward_data(self.rng)
+        fields = {"le": "leAmount", "water": "wateringTools", "chase_crow": "chaseCrowTools",
+                  "ticket": "numberOfLotteryTickets", "seed": "numberOfSeeds"}
+        for reward in rewards:
+            account.user_data[fields[reward["name"]]] += reward["amount"]
+        return rewards
+
+    def _use_tool(self, account: StubAccount, slot_id: str, flag: str, tool_field: str | None) -> web.Response:
+        slot = self.slots_by_id.get(slot_id)
+        if slot is None:
+            return self.fail(3, "Slot not found")
+        if not slot["actionInfos"][flag]:
+            return self.fail(6, "Nothing to do")
+        if tool_field is not None:
+            if account.user_data[tool_field] < 1:
+                return self.fail(7, "Not enough tools")
+            account.user_data[tool_field] -= 1
+        slot["actionInfos"][flag] = False
+        slot["actionInfos"]["lastCrowTime" if flag == "isHaveCrow" else "lastWaterTime"] = int(time() * 1000)
+        return self.ok(self._reward(account))
+
+    async def water_plant(self, request: web.Request) -> web.Response:
+        account = self._account(request)
+        payload = await request.json()
+        return self._use_tool(account, payload["slotId"], "isNeedWater", "wateringTools")
+
+    async def chase_crow(self, request: web.Request) -> web.Response:
+        account = self._account(request)
+        payload = await request.json()
+        return self._use_tool(account, payload["slotId"], "isHaveCrow", "chaseCrowTools")
+
+    async def chase_good_crow(self, request: web.Request) -> web.Response:
+        account = self._account(request)
+        payload = await request.json()
+        slot = self.slots_by_id.get(payload["slotId"])
+        if slot is None or not slot.get("decoEffects", {}).get("isGoodCrow"):
+            return self.fail(6, "Nothing to do")
+        slot["decoEffects"]["isGoodCrow"] = False
+        return self.ok(self._reward(account))
+
+    async def harvest_plant(self, request: web.Request) -> web.Response:
+        account = self._account(request)
+        payload = await request.json()
+        now_ms = int(time() * 1000)
+        rewards = []
+        for slot_id in payload["slotIds"]:
+            slot = self.slots_by_id.get(slot_id)
+            if slot is None or slot["ownerId"] != account.address or slot.get("harvestTime", now_ms + 1) > now_ms:
+                return self.fail(8, f"Slot {slot_id} can not be harvested")
+        for slot_id in payload["slotIds"]:
+            self.slots_by_id[slot_id]["harvestTime"] = now_ms + 86_400_000
+            rewards.extend(self._reward(account))
+        return self.ok(rewards)
+
+    # -- Запуск
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Локальная заглушка PVU API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--accounts", type=int, default=10)
+    parser.add_argument("--lands", type=int, default=2, help="Земель на аккаунт")
+    parser.add_argument("--slots", type=int, default=10, help="Слотов на землю")
+    parser.add_argument("--shared-lands", type=int, default=0, help="Общих земель, на которых растения всех аккаунтов")
+    parser.add_argument("--latency", type=float, nargs=2, default=(0.0, 0.0), metavar=("MIN", "MAX"))
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rps", type=float, default=None)
+    parser.add_argument("--tokens-file", type=Path, default=None, help="Куда записать токены аккаунтов")
+    args = parser.parse_args()
+
+    server = PVUStubServer(
+        accounts=args.accounts,
+        lands_per_account=args.lands,
+        slots_per_land=args.slots,
+        latency=tuple(args.latency),
+        error_rate=args.error_rate,
+        throttle_rps=args.throttle_rps,
+        shared_lands=args.shared_lands,
+    )
+    base_url = await server.start(args.host, args.port)
+    if args.tokens_file is not None:
+        args.tokens_file.write_text("\n".join(server.tokens) + "\n")
+    print(f"Заглушка PVU API запущена: {base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
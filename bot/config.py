@@ -1,4 +1,44 @@
 LOGGING_LEVEL = "INFO"
-SLEEP_TIME = 150
+LOG_JSON = False  # Писать лог-файл в формате JSON: по объекту на строку, аккаунт, земля и слот — отдельными полями
+LOG_SLOT_ACTIONS = False  # Писать в лог каждое действие со слотом. False — одна итоговая строка на землю
+API_BASE_URL = "https://api.plantvsundead.com"  # Адрес API. Можно указать локальный сервер-заглушку для тестов
+MIN_POLL_INTERVAL = 30  # Минимальный интервал между проверками одной земли в секундах
+MAX_POLL_INTERVAL = 150  # Максимальный интервал между проверками одной земли в секундах
 PROCESS_ONLY_MY_PLANTS = True  # Обрабатывать только мои растения? True or False
-PROCESS_DELAY = (0.75, 0.8)  # Задержка между действиями (MIN_SECONDS, MAX_SECONDS)
+MAX_CONCURRENT_ACCOUNTS = 20  # Максимальное количество одновременно обрабатываемых аккаунтов на каждой стадии (получение данных и действия)
+AUTH_TOKEN_MAX_AGE = None  # Максимальный возраст сохраненного токена в секундах. None — перевыпускать только при отказе API
+ACTION_RETRIES = 4  # Сколько раз повторять действие (покупку, полив, прогон ворон, сбор наград), не выполненное из-за сбоя сети или API
+ACTION_RETRY_BACKOFF = (5, 120)  # Задержка перед повтором действия (НАЧАЛЬНАЯ, МАКСИМАЛЬНАЯ) в секундах, растет экспоненциально
+HARVEST_BATCH_SIZE = 50  # Максимальное количество растений в одном запросе сбора наград
+# Ограничение частоты запросов к API (НАЧАЛЬНОЕ, МАКСИМАЛЬНОЕ) в запросах в секунду.
+# При троттлинге со стороны API частота снижается, а при успешных запросах снова растет
+GLOBAL_RATE_LIMIT = (20, 50)  # Для всех аккаунтов вместе, а при работе через прокси - для каждого прокси
+ACCOUNT_RATE_LIMIT = (1.25, 5)  # Для одного аккаунта
+RATE_LIMIT_DECREASE_FACTOR = 0.5  # Во сколько раз снижать частоту при троттлинге
+RATE_LIMIT_INCREASE_STEP = 0.1  # На сколько повышать частоту после успешного запроса
+THROTTLE_RETRIES = 3  # Сколько раз повторять запрос, отклоненный из-за троттлинга
+REQUEST_TIMEOUT = 15  # Таймаут одного запроса к API в секундах
+REQUEST_RETRIES = 3  # Сколько раз повторять GET-запросы при сетевых ошибках
+RETRY_BACKOFF = (0.5, 10)  # Задержка перед повтором (НАЧАЛЬНАЯ, МАКСИМАЛЬНАЯ) в секундах, растет экспоненциально
+CIRCUIT_BREAKER_THRESHOLD = 5  # После скольких сетевых ошибок подряд приостанавливать запросы к API
+CIRCUIT_BREAKER_COOLDOWN = 30  # На сколько секунд приостанавливать запросы к API
+PROXY_ASSIGNMENT = "sticky"  # Распределение аккаунтов по прокси из input/proxies.txt: "sticky" — аккаунт всегда через один прокси, "round_robin" — по очереди
+PROXY_MAX_FAILURES = 3  # После скольких сетевых ошибок подряд прокси исключается, а его аккаунты переназначаются на другие
+PROXY_HEALTH_CHECK_INTERVAL = 60  # Как часто проверять доступность прокси в секундах. Исключенный прокси возвращается после успешной проверки
+CONNECTION_LIMIT = 100  # Максимальное количество открытых соединений с API (для каждого прокси отдельно)
+CONNECTION_LIMIT_PER_HOST = 50  # Максимальное количество открытых соединений с одним хостом
+KEEPALIVE_TIMEOUT = 60  # Сколько секунд держать простаивающее соединение открытым
+DNS_CACHE_TTL = 300  # Сколько секунд хранить результаты DNS-запросов
+LANDS_CACHE_TTL = 1800  # Сколько секунд использовать полученный список земель аккаунта. 0 — запрашивать каждый раз
+LANDS_CACHE_PERSIST = True  # Сохранять списки земель между перезапусками
+SLOTS_CACHE_TTL = 5  # Сколько секунд переиспользовать полученные слоты земли для других аккаунтов на этой же земле. 0 — только объединять одновременные запросы
+VALIDATE_MODELS = False  # Проверять данные API при создании моделей. Замедляет работу, полезно для отладки
+SIGNING_PROCESSES = 2  # Количество процессов для подписи сообщений при авторизации по приватным ключам
+METRICS_HOST = "127.0.0.1"  # Адрес, на котором отдаются метрики Prometheus
+METRICS_PORT = None  # Порт для метрик Prometheus (http://METRICS_HOST:METRICS_PORT/metrics). None — не запускать
+TRACING = False  # Трассировать циклы обработки: файл трассировки в папке log/traces и отчет о времени фаз в логе
+TRACE_FILES_KEEP = 10  # Сколько последних файлов трассировки хранить
+SHARDS = 1  # Количество процессов-воркеров, между которыми делятся аккаунты. 1 — все аккаунты в одном процессе
+SHARD_HEARTBEAT_INTERVAL = 10  # Как часто шард сообщает координатору, что он жив, в секундах
+SHARD_HEARTBEAT_TIMEOUT = 120  # Через сколько секунд без сообщений шард считается зависшим и перезапускается
+SHARD_RESTART_DELAY = 5  # Задержка перед перезапуском упавшего шарда в секундах
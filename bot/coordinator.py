@@ -0,0 +1,102 @@
+import asyncio
+import multiprocessing
+from multiprocessing.process import BaseProcess
+from queue import Empty
+from time import time
+
+from bot.config import LOGGING_LEVEL, LOG_JSON, SHARD_HEARTBEAT_INTERVAL, SHARD_HEARTBEAT_TIMEOUT, SHARD_RESTART_DELAY
+from bot.logger import logger, setup_logger
+from bot.sharding import Shard
+from bot.worker import CycleSummary, work
+
+
+def _run_shard(index: int, count: int, queue: multiprocessing.Queue):
+    shard = Shard(index, count)
+    setup_logger(LOGGING_LEVEL, json_file=LOG_JSON, shard=shard)
+    try:
+        asyncio.run(work(shard, report=queue.put))
+    except KeyboardInterrupt:
+        pass
+
+
+# Запускает шарды в отдельных процессах, перезапускает упавшие и зависшие
+# и сводит итоги циклов обработки всех шардов
+class Coordinator:
+    def __init__(self, shards: int):
+        self.shards = shards
+        self._context = multiprocessing.get_context("spawn")
+        self._queue = self._context.Queue()
+        self._processes: dict[int, BaseProcess] = {}
+        self._heartbeats: dict[int, float] = {}
+        self._restart_times: dict[int, float] = {}
+        self._summaries: dict[int, CycleSummary] = {}
+
+    def _start(self, index: int):
+        process = self._context.Process(
+            target=_run_shard,
+            args=(index, self.shards, self._queue),
+            name=f"shard-{index}",
+            # Не демон: шарду нужен свой пул процессов для подписи сообщений при авторизации
+            daemon=False,
+        )
+        process.start()
+        self._processes[index] = process
+        self._heartbeats[index] = time()
+        logger.bind(shard=str(Shard(index, self.shards))).info(f"Запущен процесс {process.pid}")
+
+    def _stop(self, index: int):
+        process = self._processes.pop(index)
+        process.kill()
+        process.join()
+
+    def _check_health(self):
+        now = time()
+        for index, process in list(self._processes.items()):
+            shard_log = logger.bind(shard=str(Shard(index, self.shards)))
+            if process.exitcode == 0:
+                shard_log.info("Процесс завершил работу")
+                del self._processes[index]
+            elif process.exitcode is not None:
+                shard_log.error(
+                    f"Процесс упал с кодом {process.exitcode}, перезапуск через {SHARD_RESTART_DELAY} сек.")
+                del self._processes[index]
+                self._restart_times[index] = now + SHARD_RESTART_DELAY
+            elif now - self._heartbeats[index] > SHARD_HEARTBEAT_TIMEOUT:
+                shard_log.error(f"Процесс не отвечает {now - self._heartbeats[index]:.0f} сек., перезапуск")
+                self._stop(index)
+                self._restart_times[index] = now + SHARD_RESTART_DELAY
+        for index, restart_time in list(self._restart_times.items()):
+            if now >= restart_time:
+                del self._restart_times[index]
+                self._start(index)
+
+    def _handle(self, message: tuple[str, int, dict | None]):
+        kind, index, payload = message
+        self._heartbeats[index] = time()
+        if kind != "summary":
+            return
+        self._summaries[index] = CycleSummary(**payload)
+        summary = CycleSummary.merge(list(self._summaries.values()))
+        logger.info(
+            f"Итоги по последним циклам {len(self._summaries)} шардов:"
+            f" аккаунтов: {summary.accounts}"
+            f", обработано успешно: {summary.succeeded}"
+            f", с ошибками: {summary.failed}"
+        )
+
+    def run(self):
+        for index in range(self.shards):
+            self._start(index)
+        try:
+            while self._processes or self._restart_times:
+                try:
+                    self._handle(self._queue.get(timeout=SHARD_HEARTBEAT_INTERVAL))
+                except Empty:
+                    pass
+                self._check_health()
+        finally:
+            for process in self._processes.values():
+                process.join(timeout=SHARD_HEARTBEAT_INTERVAL)
+                if process.is_alive():
+                    process.kill()
+                    process.join()
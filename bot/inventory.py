@@ -0,0 +1,58 @@
+from bot.pvu_api import AuthToken, PVUClient, get_user_info
+from bot.pvu_api.enums import ToolType
+from bot.pvu_api.exceptions import PVUException
+from bot.pvu_api.models import User, Reward
+
+
+TOOL_PRICE = 10  # Стоимость одного инструмента в LE
+
+
+# Локальный учет ресурсов аккаунта: данные о пользователе запрашиваются один раз,
+# а затем обновляются по покупкам, использованию инструментов и полученным наградам
+class Inventory:
+    def __init__(self, user: User):
+        self.user = user
+        self.stale = False
+
+    # Количество пугалок и воды к покупке под общую потребность всех земель аккаунта.
+    # Если LE не хватает на все, в первую очередь покупаются пугалки
+    def plan_purchases(self, crow_amount: int, need_water_amount: int) -> tuple[int, int]:
+        budget = self.user.le_amount // TOOL_PRICE
+        chase_crow_tools_to_buy = min(max(crow_amount - self.user.chase_crow_tools, 0), budget)
+        budget -= chase_crow_tools_to_buy
+        watering_tools_to_buy = min(max(need_water_amount - self.user.watering_tools, 0), budget)
+        return chase_crow_tools_to_buy, watering_tools_to_buy
+
+    def on_purchase(self, tool_type: ToolType, quantity: int):
+        self.user.le_amount -= quantity * TOOL_PRICE
+        if tool_type is ToolType.SCARECROW:
+            self.user.chase_crow_tools += quantity
+        else:
+            self.user.watering_tools += quantity
+
+    def on_tool_used(self, tool_type: ToolType, reward: Reward):
+        if tool_type is ToolType.SCARECROW:
+            self.user.chase_crow_tools -= 1
+        else:
+            self.user.watering_tools -= 1
+        self.add_reward(reward)
+
+    def add_reward(self, reward: Reward):
+        self.user.le_amount += reward.le
+        self.user.watering_tools += reward.water
+        self.user.chase_crow_tools += reward.scarecrows
+        self.user.number_of_lottery_tickets += reward.tickets
+        self.user.number_of_seeds += reward.seeds
+
+    def on_error(self, error: BaseException):
+        # Ошибка API (а не сетевая) при покупке или использовании инструмента
+        # скорее всего означает, что локальный учет разошелся с данными сервера
+        if type(error) is PVUException:
+            self.stale = True
+
+    async def refresh(self, client: PVUClient, token: AuthToken):
+        # Сбрасываем признак до запроса: при неудаче учет не запрашивается заново перед каждым слотом
+        self.stale = False
+        fresh_user = await get_user_info(client, token)
+        # Обновляем тот же объект, чтобы ссылки на него оставались актуальными
+        self.user.__dict__.update(fresh_user.__dict__)
@@ -1,19 +1,57 @@
+import json
 import logging
 import sys
 from os import makedirs
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from loguru import logger
 
-from bot.config import LOGGING_LEVEL
 from bot.paths import LOG_DIR
 
+if TYPE_CHECKING:
+    from bot.sharding import Shard
 
-makedirs(LOG_DIR, exist_ok=True)
 
-FILE_LOG_FORMAT    = "<white>{time:HH:mm:ss}</white> | <level>{level: <8}</level> | <white>{message}</white>"
-CONSOLE_LOG_FORMAT = "<white>{time:HH:mm:ss}</white> | <level>{level: <8}</level> | <white>{message}</white>"
+FILE_LOG_FORMAT    = "<white>{time:HH:mm:ss}</white> | <level>{level: <8}</level> | <white>{extra[context]}{message}</white>"
+CONSOLE_LOG_FORMAT = "<white>{time:HH:mm:ss}</white> | <level>{level: <8}</level> | <white>{extra[context]}{message}</white>"
+
+# Поля контекста записи (logger.bind) и их вид в префиксе текстового лога
+CONTEXT_FIELDS = {
+    "shard": "shard={}",
+    "account": "{}",
+    "land": "land.x={}, land.y={}",
+    "slot": "slot.x={}, slot.y={}",
+}
+
+
+def _add_context(record):
+    # Префикс вида "[0x...] [land.x=1, land.y=2] " из контекста записи
+    extra = record["extra"]
+    context = ""
+    for field, template in CONTEXT_FIELDS.items():
+        value = extra.get(field)
+        if value is not None:
+            context += "[" + (template.format(*value) if isinstance(value, tuple) else template.format(value)) + "] "
+    extra["context"] = context
+
+
+def _json_format(record) -> str:
+    # Одна запись - один JSON-объект в строке, контекст - отдельными полями
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "message": record["message"],
+    }
+    for field in CONTEXT_FIELDS:
+        if record["extra"].get(field) is not None:
+            entry[field] = record["extra"][field]
+    if record["exception"] is not None:
+        entry["exception"] = "".join(logging.Formatter().formatException(
+            (record["exception"].type, record["exception"].value, record["exception"].traceback)))
+    record["extra"]["json"] = json.dumps(entry, ensure_ascii=False, default=str)
+    return "{extra[json]}\n"
 
 
 class InterceptHandler(logging.Handler):
@@ -33,13 +71,17 @@ class InterceptHandler(logging.Handler):
         logger_opt.log(self._get_level(record), record.getMessage())
 
 
-def setup(level="DEBUG"):
+def setup_logger(level="DEBUG", json_file: bool = False, shard: "Shard | None" = None):
+    # Записи пишутся в файл и консоль из отдельного потока (enqueue), не задерживая цикл событий.
+    # enqueue упорядочивает записи только внутри процесса, поэтому у каждого шарда свой лог-файл
+    makedirs(LOG_DIR, exist_ok=True)
     logger.remove()
-    log_file_name = f"{datetime.now().strftime('%d-%m-%Y')}.log"
+    logger.configure(patcher=_add_context, extra={"shard": str(shard) if shard is not None else None})
+    shard_suffix = f".shard{shard.index}" if shard is not None else ""
+    log_file_name = f"{datetime.now().strftime('%d-%m-%Y')}{shard_suffix}.{'jsonl' if json_file else 'log'}"
     log_file_path = Path(LOG_DIR, log_file_name)
-    logger.add(log_file_path, format=FILE_LOG_FORMAT, level=level, rotation='1 day')
+    file_format = _json_format if json_file else FILE_LOG_FORMAT
+    logger.add(log_file_path, format=file_format, level=level, rotation='1 day', enqueue=True)
     logging.basicConfig(handlers=[InterceptHandler()], level=logging.INFO)
-    logger.add(sys.stderr, colorize=True, format=CONSOLE_LOG_FORMAT, level=level)
-
+    logger.add(sys.stderr, colorize=True, format=CONSOLE_LOG_FORMAT, level=level, enqueue=True)
 
-setup(LOGGING_LEVEL)
@@ -0,0 +1,157 @@
+from math import inf
+from typing import TYPE_CHECKING
+
+from bot.logger import logger
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+
+# Минимальная реализация метрик в текстовом формате Prometheus без внешних зависимостей
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+    DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, inf)
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: tuple[str, ...] = (),
+            buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets if buckets[-1] == inf else (*buckets, inf)
+        self._counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self._counts.setdefault(key, [0] * len(self.buckets))
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        self._sums[key] = self._sums.get(key, 0) + value
+
+    def _samples(self) -> list[str]:
+        samples = []
+        for key, counts in self._counts.items():
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, counts):
+                samples.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {count}")
+            samples.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(self._sums[key])}")
+            samples.append(f"{self.name}_count{_format_labels(labels)} {counts[-1]}")
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+registry = Registry()
+
+requests_total: Counter = registry.register(Counter(
+    "pvu_requests_total", "Запросы к PVU API", ("endpoint", "outcome", "status")))
+request_duration: Histogram = registry.register(Histogram(
+    "pvu_request_duration_seconds", "Время выполнения запросов к PVU API", ("endpoint", "outcome")))
+coalesced_requests: Counter = registry.register(Counter(
+    "pvu_coalesced_requests_total", "Запросы, обслуженные общим запросом или кешем без обращения к API",
+    ("endpoint", "source")))
+action_retries: Counter = registry.register(Counter(
+    "pvu_action_retries_total", "Повторы неудавшихся действий: поставлены в очередь, выполнены, отброшены",
+    ("action", "result")))
+proxies: Gauge = registry.register(Gauge(
+    "pvu_proxies", "Прокси: доступные и исключенные", ("state",)))
+accounts: Gauge = registry.register(Gauge(
+    "pvu_accounts", "Загруженные аккаунты"))
+scheduled_lands: Gauge = registry.register(Gauge(
+    "pvu_scheduled_lands", "Земли в очереди планировщика"))
+cycle_accounts: Gauge = registry.register(Gauge(
+    "pvu_cycle_accounts", "Аккаунты, обработанные за последний запуск обработки", ("result",)))
+cycle_duration: Gauge = registry.register(Gauge(
+    "pvu_cycle_duration_seconds", "Длительность последнего запуска обработки"))
+lands_processed: Counter = registry.register(Counter(
+    "pvu_lands_processed_total", "Обработанные земли"))
+slots_processed: Counter = registry.register(Counter(
+    "pvu_slots_processed_total", "Обработанные слоты (растения)"))
+
+
+async def _metrics_handler(request: "web.Request") -> "web.Response":
+    from aiohttp import web
+
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(host: str, port: int) -> "web.AppRunner":
+    from aiohttp import web
+
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны по адресу http://{host}:{port}/metrics")
+    return runner
@@ -5,6 +5,11 @@ SCRIPT_DIR = Path(__file__).parent
 BASE_DIR = SCRIPT_DIR.parent
 INPUT_DIR = BASE_DIR / "input"
 LOG_DIR = BASE_DIR / "log"
+STATE_DIR = BASE_DIR / "state"
+TRACE_DIR = LOG_DIR / "traces"
 
 PRIVATE_KEYS_TXT = INPUT_DIR / "private_keys.txt"
 TOKENS_TXT = INPUT_DIR / "tokens.txt"
+PROXIES_TXT = INPUT_DIR / "proxies.txt"
+AUTH_TOKENS_JSON = STATE_DIR / "auth_tokens.json"
+STATE_DB = STATE_DIR / "state.sqlite3"
@@ -1,10 +1,15 @@
+from .auth import AuthToken
+from .client import PVUClient
 from .pvu_api import (
     get_auth_token,
+    get_auth_tokens,
     get_nonce_to_sign,
     get_land,
     get_slots_by_location,
+    invalidate_slots,
     get_slots,
     get_user_info,
+    buy_tools,
     buy_water,
     buy_scarecrow,
     water_plant,
@@ -14,12 +19,17 @@ from .pvu_api import (
 )
 
 __all__ = [
+    "AuthToken",
+    "PVUClient",
     "get_auth_token",
+    "get_auth_tokens",
     "get_nonce_to_sign",
     "get_land",
     "get_slots_by_location",
+    "invalidate_slots",
     "get_slots",
     "get_user_info",
+    "buy_tools",
     "buy_water",
     "buy_scarecrow",
     "water_plant",
@@ -0,0 +1,27 @@
+import json
+from typing import Any
+
+# orjson заметно быстрее стандартного json на больших ответах (например, get-by-coordinate),
+# но является необязательной зависимостью
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+
+    def loads(data: bytes) -> Any:
+        return orjson.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+else:
+    JSON_BACKEND = "json"
+
+    def loads(data: bytes) -> Any:
+        return json.loads(data)
+
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode()
@@ -0,0 +1,51 @@
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from eth_account.signers.local import LocalAccount
+
+
+def sign_login_message(private_key: bytes, nonce: int) -> str:
+    # Выполняется в пуле процессов: подпись ECDSA на чистом Python занимает процессор
+    # на миллисекунды и не должна блокировать цикл событий.
+    # eth_account импортируется долго, поэтому загружается только при авторизации
+    from eth_account import Account
+    from eth_account.messages import encode_defunct
+
+    message = encode_defunct(text=f"PVU plantvsundead.com signing: {nonce}")
+    return Account.sign_message(message, private_key=private_key).signature.hex()
+
+
+class AuthToken:
+    def __init__(
+            self,
+            value: str,
+            account: "LocalAccount | None" = None,
+            issued_at: int | None = None,
+    ):
+        self.value = value
+        self.account = account
+        self.issued_at = issued_at
+
+    @property
+    def address(self) -> str | None:
+        return self.account.address if self.account is not None else None
+
+    @property
+    def key(self) -> str:
+        # Постоянный идентификатор аккаунта: не меняется при перевыпуске токена
+        return self.address or self.value
+
+    @property
+    def can_refresh(self) -> bool:
+        # Токен можно перевыпустить только если известен приватный ключ
+        return self.account is not None
+
+    @property
+    def masked(self) -> str:
+        return f"{self.value[:4]}...{self.value[-4:]}"
+
+    def __str__(self):
+        return self.value
+
+    def __repr__(self):
+        return f"AuthToken({self.masked})"
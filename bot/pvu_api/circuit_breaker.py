@@ -0,0 +1,38 @@
+from time import monotonic
+
+from .exceptions import PVUCircuitOpenError
+
+
+# Предохранитель: после failure_threshold сетевых ошибок подряд запросы к API
+# не отправляются в течение cooldown секунд. Затем пропускается один пробный запрос,
+# и если он успешен, работа возобновляется.
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def check(self):
+        if self._opened_at is None:
+            return
+        remaining = self._opened_at + self.cooldown - monotonic()
+        if remaining > 0:
+            raise PVUCircuitOpenError(
+                status=-1, msg=f"API недоступно, запросы приостановлены ещё на {remaining:.0f} сек.",
+                retry_after=remaining)
+        # Пробный запрос: остальные ждут еще cooldown секунд или до его успеха
+        self._opened_at = monotonic()
+
+    def on_success(self):
+        self._failures = 0
+        self._opened_at = None
+
+    def on_failure(self):
+        self._failures += 1
+        if self._opened_at is not None or self._failures >= self.failure_threshold:
+            self._opened_at = monotonic()
@@ -0,0 +1,93 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING
+
+from bot.config import GLOBAL_RATE_LIMIT, ACCOUNT_RATE_LIMIT, RATE_LIMIT_DECREASE_FACTOR, RATE_LIMIT_INCREASE_STEP
+from bot.config import REQUEST_TIMEOUT, CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_COOLDOWN
+from bot.config import CONNECTION_LIMIT, CONNECTION_LIMIT_PER_HOST, KEEPALIVE_TIMEOUT, DNS_CACHE_TTL
+from bot.config import API_BASE_URL, SIGNING_PROCESSES, SLOTS_CACHE_TTL, PROXY_ASSIGNMENT, PROXY_MAX_FAILURES
+from .rate_limit import RateLimiter
+from .circuit_breaker import CircuitBreaker
+from .single_flight import SingleFlight
+from .proxy_pool import ProxyPool
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+def _create_session() -> "aiohttp.ClientSession":
+    # aiohttp импортируется здесь же, чтобы не замедлять запуск скрипта
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(
+        limit=CONNECTION_LIMIT,
+        limit_per_host=CONNECTION_LIMIT_PER_HOST,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+    )
+
+
+# Клиент API: одна HTTP-сессия с пулом соединений на все время работы скрипта,
+# а также общие для всех запросов ограничитель частоты, предохранитель и объединение одинаковых запросов
+class PVUClient:
+    def __init__(
+            self,
+            base_url: str = API_BASE_URL,
+            global_rate: tuple[float, float] = GLOBAL_RATE_LIMIT,
+            account_rate: tuple[float, float] = ACCOUNT_RATE_LIMIT,
+            proxies: list[str] | None = None,
+            proxy_assignment: str = PROXY_ASSIGNMENT,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.rate_limiter = RateLimiter(
+            global_rate,
+            account_rate,
+            decrease_factor=RATE_LIMIT_DECREASE_FACTOR,
+            increase_step=RATE_LIMIT_INCREASE_STEP,
+        )
+        self.circuit_breaker = CircuitBreaker(CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_COOLDOWN)
+        self.slots_requests = SingleFlight(SLOTS_CACHE_TTL)
+        self.refresh_locks: dict[str, asyncio.Lock] = {}
+        # С прокси у каждого прокси своя сессия, а общая сессия не используется
+        self.proxy_pool = ProxyPool(proxies, proxy_assignment, _create_session, PROXY_MAX_FAILURES) if proxies else None
+        self._session: "aiohttp.ClientSession | None" = None
+        self._signing_executor: ProcessPoolExecutor | None = None
+
+    @property
+    def session(self) -> "aiohttp.ClientSession":
+        # Сессия создается при первом запросе, так как ей нужен запущенный цикл событий
+        if self._session is None or self._session.closed:
+            self._session = _create_session()
+        return self._session
+
+    def proxy_for(self, key: str | None) -> str | None:
+        return self.proxy_pool.proxy_for(key) if self.proxy_pool is not None else None
+
+    def session_for(self, proxy: str | None) -> "aiohttp.ClientSession":
+        return self.proxy_pool.session(proxy) if proxy is not None else self.session
+
+    @property
+    def signing_executor(self) -> ProcessPoolExecutor:
+        # Пул процессов для подписи сообщений авторизации создается при первой авторизации
+        if self._signing_executor is None:
+            self._signing_executor = ProcessPoolExecutor(max_workers=SIGNING_PROCESSES)
+        return self._signing_executor
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        if self.proxy_pool is not None:
+            await self.proxy_pool.close()
+        if self._signing_executor is not None:
+            self._signing_executor.shutdown(wait=False, cancel_futures=True)
+            self._signing_executor = None
+
+    async def __aenter__(self) -> "PVUClient":
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
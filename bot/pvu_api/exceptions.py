@@ -5,3 +5,33 @@ class PVUException(BaseException):
 
     def __str__(self):
         return f"(status {self.status}) {self.msg}"
+
+
+# API отклонило токен авторизации
+class PVUAuthError(PVUException):
+    pass
+
+
+# API ограничило частоту запросов
+class PVUThrottledError(PVUException):
+    pass
+
+
+# Сетевая ошибка, некорректный ответ или ошибка сервера API
+class PVUTransportError(PVUException):
+    pass
+
+
+class PVUTimeoutError(PVUTransportError):
+    pass
+
+
+class PVUServerError(PVUTransportError):
+    pass
+
+
+# API недоступно: запросы временно не отправляются еще retry_after секунд
+class PVUCircuitOpenError(PVUException):
+    def __init__(self, status: int, msg: str, retry_after: float = 0.0):
+        super().__init__(status, msg)
+        self.retry_after = retry_after
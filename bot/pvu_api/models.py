@@ -2,11 +2,29 @@ from datetime import datetime, timezone
 
 from pydantic import BaseModel
 
+from bot.config import VALIDATE_MODELS
+
+
+def _build(model: type[BaseModel], **fields) -> BaseModel:
+    # Данные API считаются доверенными: по умолчанию модели создаются без валидации.
+    # Это то же, что и BaseModel.construct(), но без обхода полей модели:
+    # поэтому все поля должны передаваться явно
+    if VALIDATE_MODELS:
+        return model(**fields)
+    instance = model.__new__(model)
+    object.__setattr__(instance, "__dict__", fields)
+    object.__setattr__(instance, "__fields_set__", set(fields))
+    return instance
+
 
 class Location(BaseModel):
     x: int
     y: int
 
+    @classmethod
+    def from_pvu_location_data(cls, location_data: list[int]) -> "Location":
+        return _build(cls, x=location_data[0], y=location_data[1])
+
 
 class Land(BaseModel):
     location: Location
@@ -14,6 +32,15 @@ class Land(BaseModel):
     id: str
     number_slots: int
 
+    @classmethod
+    def from_pvu_land_data(cls, land_data: dict) -> "Land":
+        return _build(
+            cls,
+            location=Location.from_pvu_location_data(land_data["location"]),
+            id=land_data["_id"],
+            number_slots=land_data["numberSlots"],
+        )
+
 
 class ActionInfo(BaseModel):
     is_have_crow: bool
@@ -42,31 +69,34 @@ class Slot(BaseModel):
 
     @classmethod
     def from_pvu_slot_data(cls, slot_data: dict) -> "Slot":
-        location = Location(x=slot_data["location"][0], y=slot_data["location"][1])
-        action_info = ActionInfo(
-            is_have_crow=slot_data["actionInfos"]["isHaveCrow"],
-            is_need_water=slot_data["actionInfos"]["isNeedWater"],
-            last_crow_time=slot_data["actionInfos"]["lastCrowTime"],
-            last_water_time=slot_data["actionInfos"]["lastWaterTime"],
-            total_crow_time=slot_data["actionInfos"]["totalCrowTime"],
-            total_water_time=slot_data["actionInfos"]["totalWaterTime"],
+        action_infos = slot_data["actionInfos"]
+        action_info = _build(
+            ActionInfo,
+            is_have_crow=action_infos["isHaveCrow"],
+            is_need_water=action_infos["isNeedWater"],
+            last_crow_time=action_infos["lastCrowTime"],
+            last_water_time=action_infos["lastWaterTime"],
+            total_crow_time=action_infos["totalCrowTime"],
+            total_water_time=action_infos["totalWaterTime"],
         )
-        slot = cls(
-            location=location,
+        harvest_time = None
+        if "harvestTime" in slot_data:
+            harvest_time = datetime.fromtimestamp(slot_data["harvestTime"] // 1000, timezone.utc)
+        deco_effects = None
+        if "decoEffects" in slot_data:
+            deco_effects = _build(DecoEffects, is_good_crow=slot_data["decoEffects"].get("isGoodCrow"))
+        return _build(
+            cls,
             action_info=action_info,
+            location=Location.from_pvu_location_data(slot_data["location"]),
+            deco_effects=deco_effects,
             id=slot_data["_id"],
             land_id=slot_data["landId"],
             type=slot_data["type"],
             status=slot_data["status"],
             owner_id=slot_data["ownerId"],
+            harvest_time=harvest_time,
         )
-        if "harvestTime" in slot_data:
-            slot.harvest_time = datetime.fromtimestamp(slot_data["harvestTime"] // 1000, timezone.utc)
-        if "decoEffects" in slot_data:
-            slot.deco_effects = DecoEffects()
-            if "isGoodCrow" in slot_data["decoEffects"]:
-                slot.deco_effects.is_good_crow = slot_data["decoEffects"]["isGoodCrow"]
-        return slot
 
 
 class User(BaseModel):
@@ -80,17 +110,16 @@ class User(BaseModel):
 
     @classmethod
     def from_pvu_user_data(cls, user_data: dict) -> "User":
-        user = cls(
+        return _build(
+            cls,
+            public_address=user_data["publicAddress"],
+            le_amount=user_data["leAmount"],
             chase_crow_tools=user_data["chaseCrowTools"],
             watering_tools=user_data["wateringTools"],
-            le_amount=user_data["leAmount"],
             number_of_boxchain_tickets=user_data["numberOfBoxchainTickets"],
             number_of_lottery_tickets=user_data["numberOfLotteryTickets"],
-            public_address=user_data["publicAddress"],
+            number_of_seeds=user_data.get("numberOfSeeds", 0),
         )
-        if "numberOfSeeds" in user_data:
-            user.number_of_seeds = user_data["numberOfSeeds"]
-        return user
 
 
 class Reward(BaseModel):
@@ -100,6 +129,16 @@ class Reward(BaseModel):
     tickets: int = 0
     seeds: int = 0
 
+    def __add__(self, other: "Reward") -> "Reward":
+        return _build(
+            Reward,
+            le=self.le + other.le,
+            water=self.water + other.water,
+            scarecrows=self.scarecrows + other.scarecrows,
+            tickets=self.tickets + other.tickets,
+            seeds=self.seeds + other.seeds,
+        )
+
     @classmethod
     def from_pvu_reward_data(cls, reward_data: list[dict]) -> "Reward":
         le = 0
@@ -118,4 +157,4 @@ class Reward(BaseModel):
                 water += reward_info["amount"]
             elif reward_info["name"] == "chase_crow":
                 scarecrows += reward_info["amount"]
-        return cls(le=le, tickets=tickets, seeds=seeds, water=water, scarecrows=scarecrows)
\ No newline at end of file
+        return _build(cls, le=le, water=water, scarecrows=scarecrows, tickets=tickets, seeds=seeds)
@@ -0,0 +1,146 @@
+import asyncio
+from hashlib import blake2b
+from typing import Callable, TYPE_CHECKING
+from urllib.parse import urlsplit
+
+from bot.logger import logger
+from bot import metrics
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+PROXY_ASSIGNMENTS = ("sticky", "round_robin")
+
+
+def normalize_proxy(line: str) -> str:
+    # Прокси без схемы считаются HTTP-прокси: host:port или user:password@host:port
+    proxy = line.strip()
+    return proxy if "://" in proxy else f"http://{proxy}"
+
+
+def _score(proxy: str, key: str) -> int:
+    return int.from_bytes(blake2b(f"{proxy}|{key}".encode(), digest_size=8).digest(), "big")
+
+
+class Proxy:
+    def __init__(self, url: str):
+        self.url = url
+        # В лог пишется только адрес прокси, без логина и пароля
+        parts = urlsplit(url)
+        self.name = f"{parts.hostname}:{parts.port}"
+        self.healthy = True
+        self.failures = 0
+        self.session: "aiohttp.ClientSession | None" = None
+
+
+# Пул прокси: у каждого прокси своя сессия с пулом соединений и свое ограничение частоты запросов.
+# sticky - аккаунт всегда ходит через один и тот же прокси (rendezvous-хеширование:
+# при исключении прокси переезжают только его аккаунты), round_robin - аккаунты распределяются по очереди.
+# Прокси исключается после max_failures сетевых ошибок подряд или неудачной проверки
+# и возвращается после успешной проверки
+class ProxyPool:
+    def __init__(
+            self,
+            proxies: list[str],
+            assignment: str,
+            session_factory: Callable[[], "aiohttp.ClientSession"],
+            max_failures: int,
+    ):
+        if assignment not in PROXY_ASSIGNMENTS:
+            raise ValueError(f"Неизвестный способ распределения прокси: {assignment}")
+        self.assignment = assignment
+        self.max_failures = max_failures
+        self._session_factory = session_factory
+        self._proxies = {url: Proxy(url) for url in proxies}
+        self._assigned: dict[str, str] = {}  # аккаунт -> прокси
+        self._next = 0
+        self._update_metrics()
+
+    def __len__(self) -> int:
+        return len(self._proxies)
+
+    def _update_metrics(self):
+        healthy = sum(proxy.healthy for proxy in self._proxies.values())
+        metrics.proxies.set(healthy, state="healthy")
+        metrics.proxies.set(len(self._proxies) - healthy, state="evicted")
+
+    def _candidates(self) -> list[Proxy]:
+        # Если исключены все прокси, запросы идут через все: напрямую запросы не отправляются никогда
+        return [proxy for proxy in self._proxies.values() if proxy.healthy] or list(self._proxies.values())
+
+    def _round_robin(self, candidates: list[Proxy]) -> Proxy:
+        self._next += 1
+        return candidates[self._next % len(candidates)]
+
+    def proxy_for(self, key: str | None) -> str:
+        # Запросы без аккаунта (авторизация) распределяются по очереди
+        if key is None:
+            return self._round_robin(self._candidates()).url
+        url = self._assigned.get(key)
+        if url is not None and self._proxies[url].healthy:
+            return url
+        candidates = self._candidates()
+        if self.assignment == "sticky":
+            url = max(candidates, key=lambda proxy: _score(proxy.url, key)).url
+        else:
+            url = self._round_robin(candidates).url
+        self._assigned[key] = url
+        return url
+
+    def session(self, url: str) -> "aiohttp.ClientSession":
+        proxy = self._proxies[url]
+        if proxy.session is None or proxy.session.closed:
+            proxy.session = self._session_factory()
+        return proxy.session
+
+    def on_success(self, url: str):
+        self._proxies[url].failures = 0
+
+    def on_failure(self, url: str):
+        proxy = self._proxies[url]
+        proxy.failures += 1
+        if proxy.healthy and proxy.failures >= self.max_failures:
+            self._evict(proxy, f"сетевых ошибок подряд: {proxy.failures}")
+
+    def _evict(self, proxy: Proxy, reason: str):
+        proxy.healthy = False
+        reassigned = [key for key, url in self._assigned.items() if url == proxy.url]
+        for key in reassigned:
+            del self._assigned[key]
+        self._update_metrics()
+        logger.warning(f"Прокси {proxy.name} исключен ({reason}), аккаунтов переназначено: {len(reassigned)}")
+
+    def _restore(self, proxy: Proxy):
+        proxy.healthy = True
+        proxy.failures = 0
+        if self.assignment == "sticky":
+            # Аккаунты вернутся на свой прокси при следующем запросе
+            self._assigned.clear()
+        self._update_metrics()
+        logger.info(f"Прокси {proxy.name} снова доступен")
+
+    async def _check(self, proxy: Proxy, url: str, timeout: float):
+        import aiohttp
+
+        try:
+            # Любой HTTP-ответ означает, что через прокси можно достучаться до API
+            async with self.session(proxy.url).get(
+                    url, proxy=proxy.url, timeout=aiohttp.ClientTimeout(total=timeout)):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if proxy.healthy:
+                self._evict(proxy, f"проверка не пройдена: {type(e).__name__}")
+            return
+        if not proxy.healthy:
+            self._restore(proxy)
+
+    async def run_health_checks(self, url: str, interval: float, timeout: float):
+        while True:
+            await asyncio.gather(*(self._check(proxy, url, timeout) for proxy in self._proxies.values()))
+            await asyncio.sleep(interval)
+
+    async def close(self):
+        for proxy in self._proxies.values():
+            if proxy.session is not None and not proxy.session.closed:
+                await proxy.session.close()
@@ -1,14 +1,27 @@
-from typing import Any
+from typing import Any, TYPE_CHECKING
+from time import time, monotonic
+from random import uniform
+import asyncio
 
-import aiohttp
-from eth_account.messages import encode_defunct
-from eth_account.account import LocalAccount
-
-from bot._web3 import w3
 from bot.logger import logger
+from bot import metrics
+from bot.tracing import span
+from bot.config import THROTTLE_RETRIES, REQUEST_TIMEOUT, REQUEST_RETRIES, RETRY_BACKOFF
 from .models import Land, Slot, Location, User, Reward
 from .enums import ToolType
-from .exceptions import PVUException
+from .exceptions import PVUException, PVUAuthError, PVUThrottledError
+from .exceptions import PVUTransportError, PVUTimeoutError, PVUServerError, PVUCircuitOpenError
+from .auth import AuthToken, sign_login_message
+from .client import PVUClient
+from ._json import loads, dumps
+
+if TYPE_CHECKING:
+    from eth_account.signers.local import LocalAccount
+
+
+# HTTP-статусы, означающие, что API отклонило токен авторизации
+AUTH_ERROR_HTTP_STATUSES = (401, 403)
+THROTTLED_HTTP_STATUS = 429
 
 
 def handle_response_data(data: dict):
@@ -19,157 +32,335 @@ def handle_response_data(data: dict):
     return data["data"]
 
 
-async def request_api(
-        session: aiohttp.ClientSession,
+# Префикс токена в заголовке authorization. Эндпоинты userInfo и my-slots принимают другой префикс
+AUTH_PREFIX = "bearerHeader"
+USER_AUTH_PREFIX = "bearerHeaderey"
+
+
+def auth_headers(token: AuthToken | str, prefix: str = AUTH_PREFIX) -> dict:
+    return {"authorization": f"{prefix} {token}"}
+
+
+def _outcome(error: PVUException | None) -> str:
+    if error is None:
+        return "success"
+    for error_type, outcome in (
+            (PVUThrottledError, "throttled"),
+            (PVUAuthError, "auth_error"),
+            (PVUTimeoutError, "timeout"),
+            (PVUServerError, "server_error"),
+            (PVUTransportError, "transport_error"),
+            (PVUCircuitOpenError, "circuit_open"),
+    ):
+        if isinstance(error, error_type):
+            return outcome
+    return "pvu_error"
+
+
+def _record_request(endpoint: str, error: PVUException | None, duration: float | None = None):
+    outcome = _outcome(error)
+    status = error.status if error is not None else 0
+    metrics.requests_total.inc(endpoint=endpoint, outcome=outcome, status=status)
+    if duration is not None:
+        metrics.request_duration.observe(duration, endpoint=endpoint, outcome=outcome)
+
+
+async def _send_request(
+        client: PVUClient,
+        method: str,
+        url: str,
+        limiter_key: str | None,
+        proxy: str | None,
+        headers: dict | None,
+        params: dict | None,
+        body: bytes | None,
+) -> Any:
+    import aiohttp
+
+    try:
+        async with client.session_for(proxy).request(
+                method, url, headers=headers, params=params, data=body, proxy=proxy,
+        ) as response:
+            if proxy is not None:
+                client.proxy_pool.on_success(proxy)
+            if response.status >= 500:
+                raise PVUServerError(status=response.status, msg=response.reason)
+            # Любой другой ответ означает, что API доступно
+            client.circuit_breaker.on_success()
+            if response.status == THROTTLED_HTTP_STATUS:
+                client.rate_limiter.on_throttled(limiter_key, proxy)
+                raise PVUThrottledError(status=response.status, msg=response.reason)
+            if response.status in AUTH_ERROR_HTTP_STATUSES:
+                raise PVUAuthError(status=response.status, msg=response.reason)
+            client.rate_limiter.on_success(limiter_key, proxy)
+            # Декодируем тело ответа напрямую, без проверки Content-Type
+            return loads(await response.read())
+    except PVUServerError:
+        client.circuit_breaker.on_failure()
+        raise
+    except asyncio.TimeoutError:
+        _on_transport_failure(client, proxy)
+        raise PVUTimeoutError(status=-1, msg=f"Нет ответа от API за {REQUEST_TIMEOUT} сек.")
+    except (aiohttp.ClientError, ValueError) as e:
+        _on_transport_failure(client, proxy)
+        raise PVUTransportError(status=-1, msg=f"{type(e).__name__}: {e}")
+
+
+def _on_transport_failure(client: PVUClient, proxy: str | None):
+    # Сетевая ошибка при работе через прокси - сбой прокси, а не API:
+    # такой прокси исключается, а запросы аккаунтов идут через остальные
+    if proxy is not None:
+        client.proxy_pool.on_failure(proxy)
+    else:
+        client.circuit_breaker.on_failure()
+
+
+async def _request_api(
+        client: PVUClient,
         method: str,
         url: str,
         *,
+        token: AuthToken | str | None = None,
+        auth_prefix: str = AUTH_PREFIX,
         headers=None,
         params=None,
         payload=None
 ) -> Any:
-    response = await session.request(method, url, headers=headers, params=params, json=payload)
-    data = await response.json()
-    return handle_response_data(data)
+    endpoint = url.rsplit("/", 1)[-1]
+    limiter_key = None
+    if token is not None:
+        headers = {**(headers or {}), **auth_headers(token, auth_prefix)}
+        limiter_key = token.key if isinstance(token, AuthToken) else token
+    body = None
+    if payload is not None:
+        headers = {**(headers or {}), "Content-Type": "application/json"}
+        body = dumps(payload)
+    try:
+        client.circuit_breaker.check()
+    except PVUCircuitOpenError as e:
+        _record_request(endpoint, e)
+        raise
+    proxy = client.proxy_for(limiter_key)
+    with span("rate_limit"):
+        await client.rate_limiter.acquire(limiter_key, proxy)
+    start_time = monotonic()
+    try:
+        data = await _send_request(client, method, url, limiter_key, proxy, headers, params, body)
+        result = handle_response_data(data)
+    except PVUException as e:
+        _record_request(endpoint, e, monotonic() - start_time)
+        raise
+    _record_request(endpoint, None, monotonic() - start_time)
+    return result
+
+
+async def refresh_auth_token(client: PVUClient, token: AuthToken, rejected_value: str):
+    lock = client.refresh_locks.setdefault(token.address, asyncio.Lock())
+    async with lock:
+        # Токен мог быть уже перевыпущен параллельным запросом
+        if token.value != rejected_value:
+            return
+        token.value = await get_auth_token(client, token.account)
+        token.issued_at = int(time())
+        logger.bind(account=token.address).info("Токен авторизации перевыпущен")
 
 
-async def get_nonce_to_sign(session: aiohttp.ClientSession, address: str) -> int:
-    url = "https://api.plantvsundead.com/users/login"
+async def request_api(
+        client: PVUClient,
+        method: str,
+        url: str,
+        *,
+        token: AuthToken | str | None = None,
+        auth_prefix: str = AUTH_PREFIX,
+        headers=None,
+        params=None,
+        payload=None
+) -> Any:
+    endpoint = url.rsplit("/", 1)[-1]
+    throttled_attempts = 0
+    transport_attempts = 0
+    auth_refreshed = False
+    # Участок трассировки охватывает запрос вместе со всеми повторами
+    with span(endpoint):
+        while True:
+            used_value = str(token) if token is not None else None
+            try:
+                return await _request_api(
+                    client, method, url, token=token, auth_prefix=auth_prefix, headers=headers, params=params, payload=payload)
+            except PVUThrottledError:
+                # Запрос не был обработан API, поэтому его можно безопасно повторить
+                throttled_attempts += 1
+                if throttled_attempts > THROTTLE_RETRIES:
+                    raise
+            except PVUTransportError:
+                # Повторяем только идемпотентные запросы: POST мог быть выполнен сервером
+                transport_attempts += 1
+                if method != "GET" or transport_attempts > REQUEST_RETRIES:
+                    raise
+                backoff = min(RETRY_BACKOFF[0] * 2 ** (transport_attempts - 1), RETRY_BACKOFF[1])
+                await asyncio.sleep(uniform(0, backoff))
+            except PVUAuthError:
+                # Повторная авторизация только если API отклонило токен
+                if auth_refreshed or not isinstance(token, AuthToken) or not token.can_refresh:
+                    raise
+                await refresh_auth_token(client, token, used_value)
+                auth_refreshed = True
+
+
+async def get_nonce_to_sign(client: PVUClient, address: str) -> int:
+    url = f"{client.base_url}/users/login"
     querystring = {"publicAddress": address}
-    data = await request_api(session, "GET", url, params=querystring)
+    data = await request_api(client, "GET", url, params=querystring)
     return data["nonce"]
 
 
-async def get_auth_token(session: aiohttp.ClientSession, account: LocalAccount) -> str:
-    nonce = await get_nonce_to_sign(session, account.address)
-    message_text = f"PVU plantvsundead.com signing: {nonce}"
-    message = encode_defunct(text=message_text)
-    signed_message = w3.eth.account.sign_message(message, private_key=account.key)
-    url = "https://api.plantvsundead.com/users/auth"
+async def get_auth_token(client: PVUClient, account: "LocalAccount") -> str:
+    nonce = await get_nonce_to_sign(client, account.address)
+    loop = asyncio.get_running_loop()
+    with span("sign_login"):
+        signature = await loop.run_in_executor(client.signing_executor, sign_login_message, account.key, nonce)
+    url = f"{client.base_url}/users/auth"
     payload = {
         "publicAddress": account.address,
-        "signature": signed_message.signature.hex(),
+        "signature": signature,
     }
-    data = await request_api(session, "POST", url, payload=payload)
+    data = await request_api(client, "POST", url, payload=payload)
     token = data["token"]
     return token
 
 
-async def get_user_info(session: aiohttp.ClientSession, token: str) -> User:
-    url = "https://api.plantvsundead.com/users/userInfo"
-    headers = {"authorization": f"bearerHeaderey {token}"}
-    data = await request_api(session, "GET", url, headers=headers)
+async def get_auth_tokens(
+        client: PVUClient,
+        accounts: list["LocalAccount"],
+) -> dict[str, str | BaseException]:
+    # Авторизация нескольких аккаунтов разом: nonce и токены запрашиваются параллельно,
+    # а ошибка одного аккаунта возвращается вместо его токена и не мешает остальным
+    results = await asyncio.gather(
+        *(get_auth_token(client, account) for account in accounts),
+        return_exceptions=True,
+    )
+    return {account.address: result for account, result in zip(accounts, results)}
+
+
+async def get_user_info(client: PVUClient, token: AuthToken | str) -> User:
+    url = f"{client.base_url}/users/userInfo"
+    data = await request_api(client, "GET", url, token=token, auth_prefix=USER_AUTH_PREFIX)
     return User.from_pvu_user_data(data)
 
 
-async def get_land(session: aiohttp.ClientSession, token: str) -> list[Land]:
-    url = "https://api.plantvsundead.com/lands/my-assets/my-slots"
-    headers = {"authorization": f"bearerHeaderey {token}"}
-    data = await request_api(session, "GET", url, headers=headers)
-    lands = []
-    for land in data:
-        location = Location(x=land["location"][0], y=land["location"][1])
-        number_slots = land["numberSlots"]
-        lands.append(Land(id=land["_id"], number_slots=number_slots, location=location))
-    return lands
+async def get_land(client: PVUClient, token: AuthToken | str) -> list[Land]:
+    url = f"{client.base_url}/lands/my-assets/my-slots"
+    data = await request_api(client, "GET", url, token=token, auth_prefix=USER_AUTH_PREFIX)
+    return [Land.from_pvu_land_data(land_data) for land_data in data]
+
+
+def _is_caller_error(error: BaseException) -> bool:
+    # Ошибки, которые относятся к аккаунту, отправившему запрос, а не к самим данным или к API:
+    # отклоненный токен и отказ API. Сбои сети, троттлинг и недоступность API общие для всех
+    if isinstance(error, (PVUTransportError, PVUThrottledError, PVUCircuitOpenError)):
+        return False
+    return isinstance(error, PVUException)
 
 
 async def get_slots_by_location(
-        session: aiohttp.ClientSession, token: str, location: Location
+        client: PVUClient, token: AuthToken | str, location: Location
 ) -> list[Slot]:
-    url = "https://api.plantvsundead.com/lands/get-by-coordinate"
+    url = f"{client.base_url}/lands/get-by-coordinate"
     querystring = {"x": location.x, "y": location.y}
-    headers = {"authorization": f"bearerHeader {token}"}
-    data = await request_api(session, "GET", url, headers=headers, params=querystring)
-    slots = []
-    for slot_data in data[0]["slots"]:
-        slots.append(Slot.from_pvu_slot_data(slot_data))
-    return slots
+    # Слоты земли одинаковы для всех аккаунтов, поэтому ключ запроса не включает токен.
+    # Общими становятся только данные ответа: модели у каждого аккаунта свои, так как он их изменяет
+    data = await client.slots_requests.do(
+        (location.x, location.y),
+        "get-by-coordinate",
+        lambda: request_api(client, "GET", url, token=token, params=querystring),
+        caller_error=_is_caller_error,
+    )
+    return [Slot.from_pvu_slot_data(slot_data) for slot_data in data[0]["slots"]]
+
+
+def invalidate_slots(client: PVUClient, location: Location):
+    # После действий на земле ее слоты нужно запрашивать заново
+    client.slots_requests.invalidate((location.x, location.y))
 
 
-async def get_slots(session: aiohttp.ClientSession, token: str) -> list[Slot]:
-    lands = await get_land(session, token)
+async def get_slots(client: PVUClient, token: AuthToken | str) -> list[Slot]:
+    lands = await get_land(client, token)
     slots = []
     for land in lands:
-        slots.extend(await get_slots_by_location(session, token, land.location))
+        slots.extend(await get_slots_by_location(client, token, land.location))
     return slots
 
 
 async def buy_tools(
-        session: aiohttp.ClientSession,
-        token: str,
+        client: PVUClient,
+        token: AuthToken | str,
         tool_type: ToolType,
         quantity: int = 1,
 ):
-    url = "https://api.plantvsundead.com/shops/buy-tools"
+    url = f"{client.base_url}/shops/buy-tools"
     payload = {
         "toolType": tool_type.value,
         "quantity": quantity,
     }
-    headers = {"authorization": f"bearerHeader {token}"}
-    await request_api(session, "POST", url, payload=payload, headers=headers)
+    await request_api(client, "POST", url, payload=payload, token=token)
 
 
 async def buy_water(
-        session: aiohttp.ClientSession,
-        token: str,
+        client: PVUClient,
+        token: AuthToken | str,
         quantity: int = 1,
 ):
-    await buy_tools(session, token, tool_type=ToolType.WATER, quantity=quantity)
+    await buy_tools(client, token, tool_type=ToolType.WATER, quantity=quantity)
 
 
 async def buy_scarecrow(
-        session: aiohttp.ClientSession,
-        token: str,
+        client: PVUClient,
+        token: AuthToken | str,
         quantity: int = 1,
 ):
-    await buy_tools(session, token, tool_type=ToolType.SCARECROW, quantity=quantity)
+    await buy_tools(client, token, tool_type=ToolType.SCARECROW, quantity=quantity)
 
 
 async def water_plant(
-        session: aiohttp.ClientSession,
-        token: str,
+        client: PVUClient,
+        token: AuthToken | str,
         slot_id: str,
 ) -> Reward:
-    url = "https://api.plantvsundead.com/farms/water-plant"
+    url = f"{client.base_url}/farms/water-plant"
     payload = {"slotId": slot_id}
-    headers = {"authorization": f"bearerHeader {token}"}
-    data = await request_api(session, "POST", url, payload=payload, headers=headers)
+    data = await request_api(client, "POST", url, payload=payload, token=token)
     return Reward.from_pvu_reward_data(data)
 
 
 async def chase_crow(
-        session: aiohttp.ClientSession,
-        token: str,
+        client: PVUClient,
+        token: AuthToken | str,
         slot_id: str,
 ) -> Reward:
-    url = "https://api.plantvsundead.com/farms/chase-crow"
+    url = f"{client.base_url}/farms/chase-crow"
     payload = {"slotId": slot_id}
-    headers = {"authorization": f"bearerHeader {token}"}
-    data = await request_api(session, "POST", url, payload=payload, headers=headers)
+    data = await request_api(client, "POST", url, payload=payload, token=token)
     return Reward.from_pvu_reward_data(data)
 
 
 async def chase_good_crow(
-        session: aiohttp.ClientSession,
-        token: str,
+        client: PVUClient,
+        token: AuthToken | str,
         slot_id: str,
 ) -> Reward:
-    url = "https://api.plantvsundead.com/farms/chase-good-crow"
+    url = f"{client.base_url}/farms/chase-good-crow"
 
     payload = {"slotId": slot_id}
-    headers = {"authorization": f"bearerHeader {token}"}
-    data = await request_api(session, "POST", url, payload=payload, headers=headers)
+    data = await request_api(client, "POST", url, payload=payload, token=token)
     return Reward.from_pvu_reward_data(data)
 
 
 async def harvest_plants(
-        session: aiohttp.ClientSession,
-        token: str,
+        client: PVUClient,
+        token: AuthToken | str,
         slot_ids: list[str],
 ) -> Reward:
-    url = "https://api.plantvsundead.com/farms/harvest-plant"
+    url = f"{client.base_url}/farms/harvest-plant"
     payload = {"slotIds": slot_ids}
-    headers = {"authorization": f"bearerHeader {token}"}
-    data = await request_api(session, "POST", url, payload=payload, headers=headers)
+    data = await request_api(client, "POST", url, payload=payload, token=token)
     return Reward.from_pvu_reward_data(data)
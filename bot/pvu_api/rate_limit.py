@@ -0,0 +1,101 @@
+import asyncio
+from time import monotonic
+
+
+# Несколько отказов подряд в пределах этого времени считаются одним сигналом троттлинга
+DECREASE_COOLDOWN = 1.0
+
+
+# Ведро токенов: пропускает не больше rate запросов в секунду с накоплением до capacity.
+# Скорость меняется по схеме AIMD: при троттлинге уменьшается в несколько раз,
+# после каждого успешного запроса понемногу растет обратно.
+class TokenBucket:
+    def __init__(
+            self,
+            rate: float,
+            max_rate: float,
+            min_rate: float,
+            capacity: float = 1,
+    ):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = monotonic()
+        self._decreased = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        # Запросы получают разрешение строго по очереди
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def decrease(self, factor: float):
+        now = monotonic()
+        if now - self._decreased < DECREASE_COOLDOWN:
+            return
+        self._decreased = now
+        self.rate = max(self.rate * factor, self.min_rate)
+
+    def increase(self, step: float):
+        self.rate = min(self.rate + step, self.max_rate)
+
+
+# Ограничитель частоты: общее ведро на все запросы и по ведру на каждый аккаунт.
+# При работе через прокси у каждого прокси свое общее ведро, так как API ограничивает запросы по IP
+class RateLimiter:
+    def __init__(
+            self,
+            global_rate: tuple[float, float],
+            account_rate: tuple[float, float],
+            decrease_factor: float,
+            increase_step: float,
+            min_rate: float = 0.1,
+    ):
+        self.account_rate = account_rate
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.min_rate = min_rate
+        self.global_rate = global_rate
+        self.global_bucket = TokenBucket(*global_rate, min_rate=min_rate)
+        self._account_buckets: dict[str, TokenBucket] = {}
+        self._egress_buckets: dict[str, TokenBucket] = {}
+
+    def _account_bucket(self, key: str) -> TokenBucket:
+        if key not in self._account_buckets:
+            self._account_buckets[key] = TokenBucket(*self.account_rate, min_rate=self.min_rate)
+        return self._account_buckets[key]
+
+    def _global_bucket(self, egress: str | None) -> TokenBucket:
+        if egress is None:
+            return self.global_bucket
+        if egress not in self._egress_buckets:
+            self._egress_buckets[egress] = TokenBucket(*self.global_rate, min_rate=self.min_rate)
+        return self._egress_buckets[egress]
+
+    async def acquire(self, key: str | None = None, egress: str | None = None):
+        # Сначала ждем очереди аккаунта, чтобы не занимать общее ведро впустую
+        if key is not None:
+            await self._account_bucket(key).acquire()
+        await self._global_bucket(egress).acquire()
+
+    def on_throttled(self, key: str | None = None, egress: str | None = None):
+        self._global_bucket(egress).decrease(self.decrease_factor)
+        if key is not None:
+            self._account_bucket(key).decrease(self.decrease_factor)
+
+    def on_success(self, key: str | None = None, egress: str | None = None):
+        self._global_bucket(egress).increase(self.increase_step)
+        if key is not None:
+            self._account_bucket(key).increase(self.increase_step)
@@ -0,0 +1,62 @@
+import asyncio
+from time import monotonic
+from typing import Any, Awaitable, Callable, Hashable
+
+from bot import metrics
+
+
+# Объединение одинаковых запросов: одновременные запросы с одним ключом ждут один общий запрос,
+# а его результат еще ttl секунд отдается без обращения к API. Ошибки не кешируются.
+# Общий запрос отправляется от имени начавшего его: ошибку, которая относится только к нему
+# (caller_error, например отклоненный токен), остальные не получают и отправляют запрос сами
+class SingleFlight:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self._results: dict[Hashable, tuple[float, Any]] = {}  # ключ -> (срок годности, результат)
+        self._next_purge = 0.0
+
+    async def do(
+            self,
+            key: Hashable,
+            endpoint: str,
+            request: Callable[[], Awaitable[Any]],
+            caller_error: Callable[[BaseException], bool] | None = None,
+    ) -> Any:
+        cached = self._results.get(key)
+        if cached is not None and cached[0] > monotonic():
+            metrics.coalesced_requests.inc(endpoint=endpoint, source="cache")
+            return cached[1]
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(request())
+            call.add_done_callback(lambda future: self._on_done(key, future))
+            self._calls[key] = call
+            # Отмена одного из ожидающих не должна отменять общий запрос
+            return await asyncio.shield(call)
+        try:
+            result = await asyncio.shield(call)
+        except BaseException as e:
+            if caller_error is None or not caller_error(e):
+                raise
+            return await request()
+        metrics.coalesced_requests.inc(endpoint=endpoint, source="in_flight")
+        return result
+
+    def invalidate(self, key: Hashable):
+        # Результат запроса, начатого до изменения данных, получат только те, кто его уже ждет
+        self._results.pop(key, None)
+        self._calls.pop(key, None)
+
+    def _on_done(self, key: Hashable, future: asyncio.Future):
+        if self._calls.get(key) is not future:
+            # Данные изменились, пока шел запрос: его результат не кешируется
+            return
+        del self._calls[key]
+        if future.cancelled() or future.exception() is not None or self.ttl <= 0:
+            return
+        now = monotonic()
+        if now >= self._next_purge:
+            self._results = {key: cached for key, cached in self._results.items() if cached[0] > now}
+            self._next_purge = now + self.ttl
+        self._results[key] = (now + self.ttl, future.result())
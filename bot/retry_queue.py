@@ -0,0 +1,143 @@
+from random import uniform
+from time import time
+from typing import Callable
+
+from bot import metrics
+from bot.pvu_api import AuthToken
+from bot.pvu_api.enums import ToolType
+from bot.pvu_api.exceptions import PVUException, PVUTransportError, PVUThrottledError, PVUCircuitOpenError
+from bot.pvu_api.models import Land, Slot
+from bot.scheduler import Scheduler, COALESCE_WINDOW
+
+
+# Ключ планировщика (token, RETRY_KEY) - срок ближайшего повтора действий аккаунта.
+# Стоит на месте id земли и не совпадает ни с одним id
+RETRY_KEY = "retry"
+
+
+def is_retryable(error: BaseException) -> bool:
+    # Повторяются только действия, не выполненные из-за сбоя сети, троттлинга или недоступности API.
+    # Отказ API по существу (нет ворон, не хватает инструментов) повтором не исправить
+    return isinstance(error, (PVUTransportError, PVUThrottledError, PVUCircuitOpenError))
+
+
+def retry_min_delay(error: BaseException) -> float:
+    return error.retry_after if isinstance(error, PVUCircuitOpenError) else 0.0
+
+
+def retry_error_message(error: BaseException) -> str:
+    return error.msg if isinstance(error, PVUException) else "неизвестная ошибка"
+
+
+# Неудавшееся действие аккаунта: над слотом (chase_crow, water_plant, chase_good_crow, harvest)
+# или покупка инструментов (buy_tools)
+class FailedAction:
+    def __init__(
+            self,
+            action: str,
+            land: Land | None = None,
+            slot: Slot | None = None,
+            tool_type: ToolType | None = None,
+            quantity: int = 0,
+    ):
+        self.action = action
+        self.land = land
+        self.slot = slot
+        self.tool_type = tool_type
+        self.quantity = quantity
+        self.attempts = 0
+
+
+# Очередь повторов: неудавшиеся действия повторяются адресно, без повторного получения данных земель,
+# с экспоненциально растущей задержкой. Срок ближайшего повтора аккаунта хранится в общем планировщике,
+# поэтому повторы выполняются в том же цикле ожидания, что и обычные проверки земель
+class RetryQueue:
+    def __init__(self, scheduler: Scheduler, max_attempts: int, backoff: tuple[float, float]):
+        self.scheduler = scheduler
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._actions: dict[AuthToken, list[tuple[float, FailedAction]]] = {}
+        self._land_attempts: dict[tuple[AuthToken, str], int] = {}
+        # Адрес кошелька аккаунта для контекста лога: тот же, что и при обычной обработке
+        self._accounts: dict[AuthToken, str] = {}
+
+    def __len__(self) -> int:
+        return sum(len(actions) for actions in self._actions.values())
+
+    def _delay(self, attempt: int) -> float:
+        # Половина задержки фиксирована, половина случайна: повторы разных аккаунтов не совпадают
+        delay = min(self.backoff[0] * 2 ** (attempt - 1), self.backoff[1])
+        return delay / 2 + uniform(0, delay / 2)
+
+    def _reschedule(self, token: AuthToken):
+        actions = self._actions.get(token)
+        if actions:
+            self.scheduler.schedule((token, RETRY_KEY), min(due for due, _ in actions))
+        else:
+            self._actions.pop(token, None)
+            self.scheduler.discard((token, RETRY_KEY))
+
+    def add(self, token: AuthToken, action: FailedAction, min_delay: float = 0.0) -> float | None:
+        # Задержка до повтора или None, если попытки исчерпаны.
+        # min_delay - время, раньше которого повтор заведомо не удастся (предохранитель API открыт)
+        action.attempts += 1
+        if action.attempts > self.max_attempts:
+            metrics.action_retries.inc(action=action.action, result="dropped")
+            return None
+        metrics.action_retries.inc(action=action.action, result="queued")
+        delay = max(self._delay(action.attempts), min_delay + uniform(0, COALESCE_WINDOW))
+        self._actions.setdefault(token, []).append((time() + delay, action))
+        self._reschedule(token)
+        return delay
+
+    def pop_due(self, token: AuthToken) -> list[FailedAction]:
+        # Планировщик выдает ключи немного раньше срока, поэтому и здесь берем с тем же запасом
+        deadline = time() + COALESCE_WINDOW
+        actions = self._actions.get(token, [])
+        due_actions = [action for due, action in actions if due <= deadline]
+        self._actions[token] = [(due, action) for due, action in actions if due > deadline]
+        self._reschedule(token)
+        return due_actions
+
+    def set_account(self, token: AuthToken, address: str):
+        self._accounts[token] = address
+
+    def account(self, token: AuthToken) -> str:
+        return self._accounts.get(token, token.masked)
+
+    def _drop(self, token: AuthToken, dropped: Callable[[FailedAction], bool]):
+        actions = self._actions.get(token)
+        if not actions:
+            return
+        self._actions[token] = [(due, action) for due, action in actions if not dropped(action)]
+        self._reschedule(token)
+
+    def discard_land(self, token: AuthToken, land_id: str):
+        # Земля проверена заново: ее слоты обработаны по свежим данным, старые повторы не нужны
+        self._drop(token, lambda action: action.land is not None and action.land.id == land_id)
+
+    def discard_purchases(self, token: AuthToken):
+        # Покупки аккаунта запланированы заново по свежим данным пользователя
+        self._drop(token, lambda action: action.action == "buy_tools")
+
+    def pending_purchases(self, token: AuthToken) -> set[ToolType]:
+        return {action.tool_type for _, action in self._actions.get(token, []) if action.action == "buy_tools"}
+
+    def land_failed(self, token: AuthToken, land_id: str) -> float | None:
+        # Задержка до повторной проверки земли, данные которой не удалось получить, или None
+        attempts = self._land_attempts.get((token, land_id), 0) + 1
+        if attempts > self.max_attempts:
+            self._land_attempts.pop((token, land_id), None)
+            return None
+        self._land_attempts[(token, land_id)] = attempts
+        return self._delay(attempts)
+
+    def land_succeeded(self, token: AuthToken, land_id: str):
+        self._land_attempts.pop((token, land_id), None)
+
+    def discard(self, token: AuthToken):
+        self._actions.pop(token, None)
+        self._accounts.pop(token, None)
+        self.scheduler.discard((token, RETRY_KEY))
+        for key in [key for key in self._land_attempts if key[0] == token]:
+            del self._land_attempts[key]
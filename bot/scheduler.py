@@ -0,0 +1,105 @@
+import asyncio
+import heapq
+from itertools import count
+from time import time
+from typing import Hashable
+
+from bot.pvu_api.models import Slot
+
+
+# Ключи, до срока которых осталось меньше этого времени, выдаются вместе с текущими
+COALESCE_WINDOW = 1.0
+
+
+# Очередь с приоритетом по времени следующей обработки.
+# Перепланирование ключа просто добавляет новую запись в кучу,
+# устаревшие записи отбрасываются при извлечении.
+class Scheduler:
+    def __init__(self):
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._due: dict[Hashable, float] = {}
+        self._counter = count()
+        self._changed = asyncio.Event()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._due
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def schedule(self, key: Hashable, due: float):
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, next(self._counter), key))
+        self._changed.set()
+
+    def discard(self, key: Hashable):
+        self._due.pop(key, None)
+
+    def keys(self) -> list[Hashable]:
+        return list(self._due)
+
+    def _drop_stale(self):
+        while self._heap:
+            due, _, key = self._heap[0]
+            if self._due.get(key) == due:
+                break
+            heapq.heappop(self._heap)
+
+    def next_due(self) -> float | None:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> list[Hashable]:
+        keys = []
+        self._drop_stale()
+        if not self._heap or self._heap[0][0] > now:
+            return keys
+        while self._heap and self._heap[0][0] <= now + COALESCE_WINDOW:
+            _, _, key = heapq.heappop(self._heap)
+            del self._due[key]
+            keys.append(key)
+            self._drop_stale()
+        return keys
+
+    # Ждет наступления срока хотя бы одного ключа и возвращает все ключи, срок которых наступил.
+    # По истечении timeout возвращает пустой список.
+    async def wait_due(self, timeout: float | None = None) -> list[Hashable]:
+        deadline = time() + timeout if timeout is not None else None
+        while True:
+            now = time()
+            keys = self.pop_due(now)
+            if keys:
+                return keys
+            if deadline is not None and now >= deadline:
+                return []
+            wake_at = self.next_due()
+            if deadline is not None:
+                wake_at = deadline if wake_at is None else min(wake_at, deadline)
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait(),
+                    timeout=max(wake_at - now, 0) if wake_at is not None else None,
+                )
+            except asyncio.TimeoutError:
+                pass
+
+
+# Оценивает время, когда земле снова потребуется обработка: ближайший сбор наград.
+# Время полива и появления ворон API не сообщает, поэтому их находит проверка не реже, чем раз в max_interval.
+# Результат ограничен интервалом [now + min_interval, now + max_interval].
+def land_next_due(
+        slots: list[Slot],
+        owner_address: str,
+        now: float,
+        min_interval: float,
+        max_interval: float,
+) -> float:
+    due = now + max_interval
+    for slot in slots:
+        # Собирать награды можно только со своих растений
+        if slot.harvest_time is not None and slot.owner_id == owner_address:
+            harvest_at = slot.harvest_time.timestamp()
+            if harvest_at > now:
+                due = min(due, harvest_at)
+    return max(due, now + min_interval)
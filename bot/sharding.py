@@ -0,0 +1,42 @@
+from bisect import bisect
+from hashlib import blake2b
+from pathlib import Path
+
+from bot.paths import STATE_DIR
+
+
+RING_REPLICAS = 64  # Количество точек каждого шарда на кольце: чем больше, тем равномернее распределение
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+# Кольцо консистентного хеширования: аккаунт всегда попадает в один и тот же шард,
+# а при изменении количества шардов переезжает только малая часть аккаунтов
+class HashRing:
+    def __init__(self, nodes: int, replicas: int = RING_REPLICAS):
+        points = sorted((_hash(f"{node}:{replica}"), node) for node in range(nodes) for replica in range(replicas))
+        self._hashes = [point_hash for point_hash, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key: str) -> int:
+        return self._nodes[bisect(self._hashes, _hash(key)) % len(self._nodes)]
+
+
+# Шард: часть аккаунтов, обрабатываемая отдельным процессом со своим состоянием на диске
+class Shard:
+    def __init__(self, index: int, count: int):
+        self.index = index
+        self.count = count
+        self._ring = HashRing(count)
+
+    def owns(self, key: str) -> bool:
+        return self._ring.node_for(key) == self.index
+
+    @property
+    def state_dir(self) -> Path:
+        return STATE_DIR / f"shard_{self.index}"
+
+    def __str__(self) -> str:
+        return f"{self.index + 1}/{self.count}"
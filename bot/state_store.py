@@ -0,0 +1,209 @@
+import asyncio
+import json
+import sqlite3
+from pathlib import Path
+from time import time
+
+from bot.pvu_api.enums import ToolType
+from bot.pvu_api.models import Land, Location, Slot, Reward
+
+
+# Версия схемы: при изменении ключей таблиц lands и slots они пересоздаются.
+# Это только кеш состояния: земли и слоты будут обработаны заново, журналы наград и покупок сохраняются.
+# 1 - земли и слоты хранятся отдельно для каждого аккаунта: на одной земле может работать несколько аккаунтов
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lands (
+    id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    number_slots INTEGER NOT NULL,
+    next_due REAL NOT NULL,
+    PRIMARY KEY (account, id)
+);
+CREATE TABLE IF NOT EXISTS slots (
+    id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    land_id TEXT NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    type INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    owner_id TEXT NOT NULL,
+    is_have_crow INTEGER NOT NULL,
+    is_need_water INTEGER NOT NULL,
+    last_crow_time INTEGER NOT NULL,
+    last_water_time INTEGER NOT NULL,
+    total_crow_time INTEGER NOT NULL,
+    total_water_time INTEGER NOT NULL,
+    is_good_crow INTEGER,
+    harvest_time REAL,
+    PRIMARY KEY (account, id)
+);
+CREATE INDEX IF NOT EXISTS slots_land ON slots (account, land_id);
+CREATE TABLE IF NOT EXISTS rewards (
+    time REAL NOT NULL,
+    account TEXT NOT NULL,
+    action TEXT NOT NULL,
+    slot_id TEXT,
+    le INTEGER NOT NULL,
+    water INTEGER NOT NULL,
+    scarecrows INTEGER NOT NULL,
+    tickets INTEGER NOT NULL,
+    seeds INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS land_lists (
+    account TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL,
+    lands TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS purchases (
+    time REAL NOT NULL,
+    account TEXT NOT NULL,
+    tool_type INTEGER NOT NULL,
+    quantity INTEGER NOT NULL
+);
+"""
+
+UPSERT_LAND = "INSERT OR REPLACE INTO lands VALUES (?, ?, ?, ?, ?, ?)"
+DELETE_LAND = "DELETE FROM lands WHERE account = ? AND id = ?"
+UPSERT_SLOT = "INSERT OR REPLACE INTO slots VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+DELETE_LAND_SLOTS = "DELETE FROM slots WHERE account = ? AND land_id = ?"
+INSERT_REWARD = "INSERT INTO rewards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+INSERT_PURCHASE = "INSERT INTO purchases VALUES (?, ?, ?, ?)"
+UPSERT_LAND_LIST = "INSERT OR REPLACE INTO land_lists VALUES (?, ?, ?)"
+DELETE_LAND_LIST = "DELETE FROM land_lists WHERE account = ?"
+
+
+def _slot_row(account: str, slot: Slot) -> tuple:
+    action_info = slot.action_info
+    is_good_crow = slot.deco_effects.is_good_crow if slot.deco_effects is not None else None
+    harvest_time = slot.harvest_time.timestamp() if slot.harvest_time is not None else None
+    return (
+        slot.id, account, slot.land_id, slot.location.x, slot.location.y,
+        slot.type, slot.status, slot.owner_id,
+        action_info.is_have_crow, action_info.is_need_water,
+        action_info.last_crow_time, action_info.last_water_time,
+        action_info.total_crow_time, action_info.total_water_time,
+        is_good_crow, harvest_time,
+    )
+
+
+# Локальное состояние земель и слотов в SQLite (режим WAL) и журнал наград и покупок.
+# Все чтения идут из памяти, а изменения копятся и записываются на диск пачками
+# в отдельном потоке при вызове flush(), чтобы не блокировать цикл событий.
+# Сохраненное состояние слота - это его состояние после наших действий:
+# не изменившиеся с прошлой проверки слоты не требуют обработки.
+# Здесь же кешируются списки земель аккаунтов: они меняются редко
+class StateStore:
+    def __init__(self, filepath: Path, persist_land_lists: bool = False):
+        self.filepath = filepath
+        self.persist_land_lists = persist_land_lists
+        self._connection: sqlite3.Connection | None = None
+        self._lands: dict[str, dict[str, float]] = {}  # аккаунт -> id земли -> время следующей обработки
+        self._slots: dict[tuple[str, str], tuple] = {}  # (аккаунт, id слота) -> сохраненное состояние
+        self._land_lists: dict[str, tuple[float, list[Land]]] = {}  # аккаунт -> (время получения, земли)
+        self._pending: list[tuple[str, tuple]] = []
+        self._lock = asyncio.Lock()
+
+    def open(self):
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.filepath, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        version, = self._connection.execute("PRAGMA user_version").fetchone()
+        if version < SCHEMA_VERSION:
+            with self._connection:
+                self._connection.execute("DROP TABLE IF EXISTS lands")
+                self._connection.execute("DROP TABLE IF EXISTS slots")
+                self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._connection.executescript(SCHEMA)
+        for land_id, account, next_due in self._connection.execute("SELECT id, account, next_due FROM lands"):
+            self._lands.setdefault(account, {})[land_id] = next_due
+        for row in self._connection.execute("SELECT * FROM slots"):
+            self._slots[(row[1], row[0])] = tuple(row)
+        if self.persist_land_lists:
+            for account, fetched_at, lands in self._connection.execute("SELECT * FROM land_lists"):
+                self._land_lists[account] = (fetched_at, [
+                    Land(id=land_id, location=Location(x=x, y=y), number_slots=number_slots)
+                    for land_id, x, y, number_slots in json.loads(lands)
+                ])
+
+    def close(self):
+        if self._connection is not None:
+            self._write(self._pending)
+            self._pending = []
+            self._connection.close()
+            self._connection = None
+
+    def lands(self, account: str) -> dict[str, float]:
+        return dict(self._lands.get(account, {}))
+
+    def update_land(self, account: str, land: Land, next_due: float):
+        self._lands.setdefault(account, {})[land.id] = next_due
+        self._pending.append((UPSERT_LAND, (
+            land.id, account, land.location.x, land.location.y, land.number_slots, next_due)))
+
+    def remove_land(self, account: str, land_id: str):
+        self._lands.get(account, {}).pop(land_id, None)
+        self._slots = {key: row for key, row in self._slots.items() if row[1] != account or row[2] != land_id}
+        self._pending.append((DELETE_LAND, (account, land_id)))
+        self._pending.append((DELETE_LAND_SLOTS, (account, land_id)))
+
+    def land_list(self, account: str, max_age: float) -> list[Land] | None:
+        # Список земель аккаунта, если он получен не раньше max_age секунд назад
+        cached = self._land_lists.get(account)
+        if cached is None or time() - cached[0] >= max_age:
+            return None
+        return list(cached[1])
+
+    def update_land_list(self, account: str, lands: list[Land]):
+        fetched_at = time()
+        self._land_lists[account] = (fetched_at, lands)
+        if self.persist_land_lists:
+            self._pending.append((UPSERT_LAND_LIST, (account, fetched_at, json.dumps([
+                (land.id, land.location.x, land.location.y, land.number_slots) for land in lands
+            ]))))
+
+    def invalidate_land_list(self, account: str):
+        if self._land_lists.pop(account, None) is not None and self.persist_land_lists:
+            self._pending.append((DELETE_LAND_LIST, (account,)))
+
+    def diff_slots(self, account: str, slots: list[Slot]) -> list[Slot]:
+        # Новые и изменившиеся с прошлой проверки слоты. Их состояние сохраняется
+        # только после обработки, поэтому необработанные слоты останутся изменившимися
+        return [slot for slot in slots if self._slots.get((account, slot.id)) != _slot_row(account, slot)]
+
+    def update_slot(self, account: str, slot: Slot):
+        row = _slot_row(account, slot)
+        self._slots[(account, slot.id)] = row
+        self._pending.append((UPSERT_SLOT, row))
+
+    def log_reward(self, account: str, action: str, reward: Reward, slot_id: str | None = None):
+        self._pending.append((INSERT_REWARD, (
+            time(), account, action, slot_id,
+            reward.le, reward.water, reward.scarecrows, reward.tickets, reward.seeds)))
+
+    def log_purchase(self, account: str, tool_type: ToolType, quantity: int):
+        self._pending.append((INSERT_PURCHASE, (time(), account, tool_type.value, quantity)))
+
+    def _write(self, pending: list[tuple[str, tuple]]):
+        # Подряд идущие одинаковые запросы выполняются одним executemany, порядок изменений сохраняется
+        with self._connection:
+            i = 0
+            while i < len(pending):
+                sql = pending[i][0]
+                j = i
+                while j < len(pending) and pending[j][0] == sql:
+                    j += 1
+                self._connection.executemany(sql, [params for _, params in pending[i:j]])
+                i = j
+
+    async def flush(self):
+        if not self._pending or self._connection is None:
+            return
+        async with self._lock:
+            pending, self._pending = self._pending, []
+            await asyncio.to_thread(self._write, pending)
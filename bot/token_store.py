@@ -0,0 +1,40 @@
+import json
+from pathlib import Path
+from time import time
+from typing import TYPE_CHECKING
+
+from bot.pvu_api import AuthToken
+
+if TYPE_CHECKING:
+    from eth_account.signers.local import LocalAccount
+
+
+# Хранилище токенов авторизации на диске: адрес -> токен и время его выпуска
+class TokenStore:
+    def __init__(self, filepath: Path, max_age: int | None = None):
+        self.filepath = filepath
+        self.max_age = max_age
+        self._data: dict[str, dict] = {}
+        if filepath.exists():
+            with open(filepath, "r") as file:
+                self._data = json.load(file)
+
+    def get(self, account: "LocalAccount") -> AuthToken | None:
+        entry = self._data.get(account.address)
+        if entry is None:
+            return None
+        if self.max_age is not None and time() - entry["issued_at"] > self.max_age:
+            return None
+        return AuthToken(entry["token"], account, entry["issued_at"])
+
+    def update(self, tokens: list[AuthToken]):
+        for token in tokens:
+            if token.can_refresh:
+                self._data[token.address] = {"token": token.value, "issued_at": token.issued_at}
+
+    def save(self):
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        tmp_filepath = self.filepath.with_suffix(".tmp")
+        with open(tmp_filepath, "w") as file:
+            json.dump(self._data, file, indent=2)
+        tmp_filepath.replace(self.filepath)
@@ -0,0 +1,84 @@
+import json
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import count
+from pathlib import Path
+from time import perf_counter_ns
+
+
+# Дорожка (tid в формате Chrome) текущего участка: у каждого аккаунта своя,
+# чтобы параллельно обрабатываемые аккаунты не накладывались друг на друга
+_track: ContextVar[int] = ContextVar("trace_track", default=0)
+
+
+def _percentile(sorted_values: list[float], percent: int) -> float:
+    return sorted_values[min(len(sorted_values) * percent // 100, len(sorted_values) - 1)]
+
+
+# Легковесная трассировка: участки (spans) вкладываются друг в друга через contextvars
+# и выгружаются в формате Chrome Trace Event (chrome://tracing, Perfetto).
+# Пока трассировка выключена, span() ничего не замеряет
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self._events: list[tuple[str, int, int, int, dict, bool]] = []
+        self._tracks = count(1)
+        self._track_names: dict[int, str] = {}
+
+    def new_track(self, name: str | None = None) -> int:
+        track = next(self._tracks)
+        if self.enabled and name is not None:
+            self._track_names[track] = name
+        return track
+
+    @contextmanager
+    def span(self, name: str, track: int | None = None, phase: bool = True, **args):
+        # track - перейти на другую дорожку вместе со всеми вложенными участками.
+        # phase=False - участок-контейнер (аккаунт, земля): он есть в трассировке, но не в отчете по фазам
+        if not self.enabled:
+            yield
+            return
+        track_token = _track.set(track) if track is not None else None
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            self._events.append((name, start, perf_counter_ns() - start, _track.get(), args, phase))
+            if track_token is not None:
+                _track.reset(track_token)
+
+    def report(self) -> list[tuple[str, int, float, float, float, float]]:
+        # Фазы по убыванию суммарного времени: имя, количество, сумма, p50, p95, максимум (в секундах)
+        durations: dict[str, list[float]] = {}
+        for name, _, duration, _, _, phase in self._events:
+            if phase:
+                durations.setdefault(name, []).append(duration / 1e9)
+        rows = []
+        for name, values in durations.items():
+            values.sort()
+            rows.append((name, len(values), sum(values), _percentile(values, 50), _percentile(values, 95), values[-1]))
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows
+
+    def export(self, filepath: Path):
+        pid = os.getpid()
+        events = [
+            {"name": name, "ph": "X", "ts": start / 1000, "dur": duration / 1000, "pid": pid, "tid": track, "args": args}
+            for name, start, duration, track, args, _ in self._events
+        ]
+        events.extend(
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": track, "args": {"name": name}}
+            for track, name in self._track_names.items()
+        )
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        with open(filepath, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    def clear(self):
+        self._events = []
+        self._track_names = {}
+
+
+tracer = Tracer()
+span = tracer.span
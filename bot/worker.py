@@ -1,321 +1,869 @@
-from time import sleep
+from time import monotonic, time
 from datetime import datetime, timezone
 import asyncio
-from random import uniform, shuffle
+from random import shuffle
+from typing import Awaitable, Callable, TYPE_CHECKING
 
-import aiohttp
+from pydantic import BaseModel
 
-from eth_account import Account
-from eth_account.signers.local import LocalAccount
-
-from bot.pvu_api import get_auth_token, get_slots_by_location, get_land, get_user_info, harvest_plants
-from bot.pvu_api import water_plant, chase_crow, chase_good_crow
-from bot.pvu_api import buy_water, buy_scarecrow
-from bot.pvu_api.exceptions import PVUException
-from bot.paths import INPUT_DIR, PRIVATE_KEYS_TXT, TOKENS_TXT
+from bot.pvu_api import AuthToken, PVUClient, get_auth_tokens, get_slots_by_location, get_land, get_user_info, harvest_plants
+from bot.pvu_api import water_plant, chase_crow, chase_good_crow, invalidate_slots
+from bot.pvu_api import buy_water, buy_scarecrow, buy_tools
+from bot.pvu_api.exceptions import PVUException, PVUCircuitOpenError, PVUTransportError, PVUThrottledError, PVUAuthError
+from bot.pvu_api.models import Land, Slot, Reward, User
+from bot.pvu_api.enums import ToolType
+from bot.pvu_api.proxy_pool import normalize_proxy
+from bot.paths import INPUT_DIR, STATE_DIR, TRACE_DIR, PRIVATE_KEYS_TXT, TOKENS_TXT, PROXIES_TXT, AUTH_TOKENS_JSON, STATE_DB
 from bot.logger import logger
-from bot.config import SLEEP_TIME, PROCESS_ONLY_MY_PLANTS, PROCESS_DELAY
+from bot.config import PROCESS_ONLY_MY_PLANTS, MAX_CONCURRENT_ACCOUNTS, AUTH_TOKEN_MAX_AGE
+from bot.config import HARVEST_BATCH_SIZE, MIN_POLL_INTERVAL, MAX_POLL_INTERVAL
+from bot.config import METRICS_HOST, METRICS_PORT, SHARD_HEARTBEAT_INTERVAL, LOG_SLOT_ACTIONS
+from bot.config import TRACING, TRACE_FILES_KEEP, LANDS_CACHE_TTL, LANDS_CACHE_PERSIST
+from bot.config import PROXY_HEALTH_CHECK_INTERVAL, REQUEST_TIMEOUT, ACTION_RETRIES, ACTION_RETRY_BACKOFF
+from bot.token_store import TokenStore
+from bot.state_store import StateStore
+from bot.sharding import Shard
+from bot.inventory import Inventory
+from bot import metrics
+from bot.metrics import start_metrics_server
+from bot.scheduler import Scheduler, land_next_due
+from bot.retry_queue import RetryQueue, FailedAction, RETRY_KEY, is_retryable, retry_min_delay
+from bot.retry_queue import retry_error_message
+from bot.tracing import tracer, span
+
+if TYPE_CHECKING:
+    from eth_account.signers.local import LocalAccount
+    from loguru import Logger
+
+
+TOOL_NAMES = {ToolType.SCARECROW: "пугалок", ToolType.WATER: "воды"}
+# Действия над слотами, которые можно повторить: функция API, нужный инструмент и описание для лога
+SLOT_ACTIONS = {
+    "chase_crow": (chase_crow, ToolType.SCARECROW, "прогнать ворону"),
+    "water_plant": (water_plant, ToolType.WATER, "полить растение"),
+    "chase_good_crow": (chase_good_crow, None, "прогнать добрую ворону"),
+}
+
+
+def create_input_files():
+    if not INPUT_DIR.exists():
+        INPUT_DIR.mkdir(exist_ok=True)
+        logger.info(f"Создал папку для входных данных {INPUT_DIR}")
+
+    for filepath in [PRIVATE_KEYS_TXT, TOKENS_TXT, PROXIES_TXT]:
+        if not filepath.exists():
+            with open(filepath, "w"):
+                pass
+            logger.info(f"Создал файл {filepath}")
+
+
+def load_proxies() -> list[str]:
+    # Файла с прокси может не быть: тогда запросы идут напрямую
+    if not PROXIES_TXT.exists():
+        return []
+    with open(PROXIES_TXT, "r") as file:
+        proxies = [normalize_proxy(line) for line in file.readlines() if line.strip()]
+    if proxies:
+        logger.info(f"Загружено прокси: {len(proxies)}")
+    return proxies
+
+
+def _action_failed(
+        retry_queue: RetryQueue | None,
+        token: AuthToken,
+        action: FailedAction,
+        error: BaseException,
+        log: "Logger",
+        message: str,
+) -> float | None:
+    # Действие, не выполненное из-за временного сбоя, ставится в очередь повторов.
+    # Возвращает задержку до повтора или None, если действие повторяться не будет
+    delay = None
+    if retry_queue is not None and is_retryable(error):
+        delay = retry_queue.add(token, action, retry_min_delay(error))
+    if delay is None:
+        log.error(f"{message}: {retry_error_message(error)}")
+    else:
+        log.warning(f"{message}, повтор через {delay:.0f} сек.: {retry_error_message(error)}")
+    return delay
+
+
+async def _refresh_inventory(client: PVUClient, token: AuthToken, inventory: Inventory, log: "Logger"):
+    # Запрашиваем данные о пользователе заново, только если локальный учет разошелся с сервером
+    if not inventory.stale:
+        return
+    try:
+        await inventory.refresh(client, token)
+        log.info("Данные о пользователе обновлены: локальный учет разошелся с сервером")
+    except (Exception, PVUException) as e:
+        log.error(f"Не удалось обновить данные о пользователе: {retry_error_message(e)}")
+
+
+async def _harvest_batch(
+        client: PVUClient,
+        token: AuthToken,
+        slots: list[Slot],
+) -> tuple[list[Slot], Reward, list[tuple[Slot, BaseException]]]:
+    try:
+        rewards = await harvest_plants(client, token, [slot.id for slot in slots])
+        return slots, rewards, []
+    except (PVUTransportError, PVUThrottledError, PVUCircuitOpenError, PVUAuthError, Exception) as e:
+        # Ошибка не связана с составом пачки: делить ее бессмысленно
+        return [], Reward(), [(slot, e) for slot in slots]
+    except PVUException as e:
+        if len(slots) == 1:
+            return [], Reward(), [(slots[0], e)]
+
+    # API отклонило пачку: делим ее пополам, чтобы собрать награды с остальных растений
+    middle = len(slots) // 2
+    harvested, rewards, failed = await _harvest_batch(client, token, slots[:middle])
+    harvested_2, rewards_2, failed_2 = await _harvest_batch(client, token, slots[middle:])
+    return harvested + harvested_2, rewards + rewards_2, failed + failed_2
+
+
+async def harvest_slots(
+        client: PVUClient,
+        token: AuthToken,
+        slots: list[Slot],
+) -> tuple[list[Slot], Reward, list[tuple[Slot, BaseException]]]:
+    harvested: list[Slot] = []
+    rewards = Reward()
+    failed: list[tuple[Slot, BaseException]] = []
+    for i in range(0, len(slots), HARVEST_BATCH_SIZE):
+        batch_harvested, batch_rewards, batch_failed = await _harvest_batch(
+            client, token, slots[i:i + HARVEST_BATCH_SIZE])
+        harvested.extend(batch_harvested)
+        rewards += batch_rewards
+        failed.extend(batch_failed)
+    return harvested, rewards, failed
+
+
+# Аккаунт на конвейере обработки: данные, которые стадии передают друг другу
+class AccountJob:
+    def __init__(self, token: AuthToken, land_ids: set[str] | None = None):
+        self.token = token
+        self.land_ids = land_ids
+        self.start_time = monotonic()
+        self.track = tracer.new_track(token.masked)
+        # Аккаунт, земля и слот передаются в лог как контекст записи, а не как часть сообщения
+        self.log = logger.bind(account=token.masked)
+        self.lands: list[Land] = []
+        self.user: User | None = None
+        self.inventory: Inventory | None = None
+        self.land_slots: list[tuple[Land, list[Slot], list[Slot]]] = []
+        self.tools_to_buy = (0, 0)  # пугалки, вода
+        self.ready_to_harvest: list[tuple[Land, Slot]] = []
+
+
+async def fetch_account(
+        client: PVUClient,
+        scheduler: Scheduler,
+        state_store: StateStore,
+        job: AccountJob,
+        retry_queue: RetryQueue | None = None,
+) -> bool:
+    # Стадия получения данных: земли, пользователь и слоты обрабатываемых земель
+    token, land_ids, account_log = job.token, job.land_ids, job.log
+
+    # Получаем данные о землях пользователя. Они меняются редко, поэтому берутся из кеша, пока он не устарел
+    lands = state_store.land_list(token.key, LANDS_CACHE_TTL)
+    lands_cached = lands is not None
+    if not lands_cached:
+        try:
+            lands = await get_land(client, token)
+        except PVUException as e:
+            account_log.error(f"Не удалось получить данные о землях пользователя: {e}")
+            return False
+        except Exception:
+            account_log.error("Не удалось получить данные о землях пользователя: неизвестная ошибка")
+            return False
+        state_store.update_land_list(token.key, lands)
+
+    if land_ids is None:
+        scheduler.schedule((token, None), time() + MAX_POLL_INTERVAL)
+    else:
+        # Земли, которых больше нет у пользователя, не планируем
+        for land_id in land_ids - {land.id for land in lands}:
+            scheduler.discard((token, land_id))
+    for land_id in state_store.lands(token.key).keys() - {land.id for land in lands}:
+        state_store.remove_land(token.key, land_id)
+
+    # Получаем данные о пользователе один раз: дальше ресурсы учитываются локально
+    try:
+        user = await get_user_info(client, token)
+    except PVUCircuitOpenError as e:
+        # API недоступно: земли аккаунта обработаем позже
+        account_log.warning(e.msg)
+        return False
+    except:
+        account_log.error("Не удалось получить данные о пользователе")
+        return False
+    account_log = logger.bind(account=user.public_address)
+    if retry_queue is not None:
+        # Покупки планируются заново по свежим данным пользователя
+        retry_queue.set_account(token, user.public_address)
+        retry_queue.discard_purchases(token)
+    job.lands, job.user, job.inventory, job.log = lands, user, Inventory(user), account_log
+
+    # Сначала собираем данные о слотах всех обрабатываемых земель аккаунта
+    land_slots = job.land_slots
+    for land in lands:
+        # Обрабатываем только земли, срок обработки которых наступил, и новые земли
+        if land_ids is not None and land.id not in land_ids and (token, land.id) in scheduler:
+            continue
+        land_log = account_log.bind(land=(land.location.x, land.location.y))
+
+        # Получаем данные о слотах земли
+        try:
+            slots = await get_slots_by_location(client, token, land.location)
+        except PVUCircuitOpenError as e:
+            account_log.warning(e.msg)
+            return False
+        except (PVUTransportError, PVUThrottledError) as e:
+            # Временный сбой: проверяем землю снова через несколько секунд, а не через интервал опроса
+            delay = retry_queue.land_failed(token, land.id) if retry_queue is not None else None
+            if delay is None:
+                land_log.error(f"Не удалось получить данные о слотах (растениях): {e}")
+            else:
+                scheduler.schedule((token, land.id), time() + delay)
+                land_log.warning(f"Не удалось получить данные о слотах (растениях), повтор через {delay:.0f} сек.: {e}")
+            continue
+        except PVUAuthError as e:
+            land_log.error(f"Не удалось получить данные о слотах (растениях): {e}")
+            continue
+        except PVUException as e:
+            # API отклонило запрос земли: возможно, список земель аккаунта изменился
+            state_store.invalidate_land_list(token.key)
+            land_log.error(f"Не удалось получить данные о слотах (растениях): {e}")
+            continue
+        except Exception:
+            state_store.invalidate_land_list(token.key)
+            land_log.error("Не удалось получить данные о слотах (растениях): неизвестная ошибка")
+            continue
+
+        if retry_queue is not None:
+            # Слоты земли обрабатываются по свежим данным: отложенные повторы действий над ними отменяются
+            retry_queue.land_succeeded(token, land.id)
+            retry_queue.discard_land(token, land.id)
+
+        # На земле из кеша не осталось растений пользователя: список земель, скорее всего, изменился
+        if lands_cached and not any(slot.owner_id == user.public_address for slot in slots):
+            state_store.invalidate_land_list(token.key)
+
+        # По умолчанию обрабатываются только растения, принадлежащие пользователю
+        if PROCESS_ONLY_MY_PLANTS:
+            slots = [slot for slot in slots if slot.owner_id == user.public_address]
+
+        metrics.lands_processed.inc()
+        metrics.slots_processed.inc(len(slots))
+
+        # Планируем следующую обработку земли
+        next_due = land_next_due(slots, user.public_address, time(), MIN_POLL_INTERVAL, MAX_POLL_INTERVAL)
+        scheduler.schedule((token, land.id), next_due)
+        state_store.update_land(token.key, land, next_due)
+
+        # Обрабатываются только слоты, изменившиеся с прошлой проверки
+        changed_slots = state_store.diff_slots(token.key, slots)
+
+        # Подсчет количество ворон и требующих полива растений
+        crow_amount = len(list(filter(lambda slot: slot.action_info.is_have_crow, changed_slots)))
+        need_water_amount = len(list(filter(lambda slot: slot.action_info.is_need_water, changed_slots)))
+        if not (crow_amount and need_water_amount):
+            land_log.info("Обработка не требуется")
+        else:
+            land_log.info(f"Ворон: {crow_amount}, требуют воды: {need_water_amount}")
+
+        land_slots.append((land, slots, changed_slots))
+
+    return True
+
+
+def plan_account(job: AccountJob):
+    # Стадия планирования: покупки инструментов и сбор наград, без запросов к API
+    user, land_slots = job.user, job.land_slots
+    # Инструменты покупаются разом на все земли аккаунта: не больше одной покупки каждого вида
+    crow_amount = sum(slot.action_info.is_have_crow for _, _, slots in land_slots for slot in slots)
+    need_water_amount = sum(slot.action_info.is_need_water for _, _, slots in land_slots for slot in slots)
+    job.tools_to_buy = job.inventory.plan_purchases(crow_amount, need_water_amount)
+    chase_crow_tools_to_buy, watering_tools_to_buy = job.tools_to_buy
+    if (user.chase_crow_tools + chase_crow_tools_to_buy < crow_amount
+            or user.watering_tools + watering_tools_to_buy < need_water_amount):
+        job.log.warning("Не хватает LE для покупки инструментов!")
+
+    # Награды собираются разом со всех земель
+    now = datetime.utcnow().replace(tzinfo=timezone.utc)
+    for land, slots, _ in job.land_slots:
+        for slot in slots:
+            if slot.harvest_time is not None and now > slot.harvest_time:
+                # Собирать награды можно только со своих растений
+                if slot.owner_id == user.public_address:
+                    job.ready_to_harvest.append((land, slot))
+
+
+async def act_account(
+        client: PVUClient,
+        state_store: StateStore,
+        job: AccountJob,
+        retry_queue: RetryQueue | None = None,
+) -> bool:
+    # Стадия действий: покупки, обработка слотов и сбор наград
+    token, user, inventory, account_log = job.token, job.user, job.inventory, job.log
+    chase_crow_tools_to_buy, watering_tools_to_buy = job.tools_to_buy
+
+    # Покупка инструментов: пугалок и воды.
+    # Если покупка не удалась, действия этого вида выполняются только имеющимися инструментами,
+    # а если покупка будет повторена, то вместе с ней повторятся и действия, на которые не хватило инструментов
+    retried_purchases: set[ToolType] = set()
+    for tool_type, to_buy in (
+            (ToolType.SCARECROW, chase_crow_tools_to_buy),
+            (ToolType.WATER, watering_tools_to_buy),
+    ):
+        if to_buy <= 0:
+            continue
+        try:
+            if tool_type is ToolType.SCARECROW:
+                await buy_scarecrow(client, token, to_buy)
+            else:
+                await buy_water(client, token, to_buy)
+            inventory.on_purchase(tool_type, to_buy)
+            state_store.log_purchase(token.key, tool_type, to_buy)
+            account_log.success(f"Приобретено {TOOL_NAMES[tool_type]}: {to_buy}")
+        except (Exception, PVUException) as e:
+            inventory.on_error(e)
+            action = FailedAction("buy_tools", tool_type=tool_type, quantity=to_buy)
+            if _action_failed(retry_queue, token, action, e, account_log, f"Не удалось купить {TOOL_NAMES[tool_type]}"):
+                retried_purchases.add(tool_type)
+
+    for land, _, changed_slots in job.land_slots:
+        land_log = account_log.bind(land=(land.location.x, land.location.y))
+        with span("land", phase=False, x=land.location.x, y=land.location.y):
+            # Слоты, действия над которыми не выполнены: их состояние не сохраняется
+            unfinished: set[str] = set()
+            # Итоги действий на земле для одной строки лога вместо строки на каждое действие
+            crows_chased = plants_watered = good_crows_chased = 0
+            land_rewards = Reward()
+            # Перемешиваем слоты
+            shuffle(changed_slots)
+
+            # Обработка слотов (растений)
+            # -- Прогон ворон
+            for slot in changed_slots:
+                if slot.action_info.is_have_crow:
+                    slot_log = land_log.bind(slot=(slot.location.x, slot.location.y))
+                    await _refresh_inventory(client, token, inventory, account_log)
+                    if user.chase_crow_tools < 1:
+                        unfinished.add(slot.id)
+                        if ToolType.SCARECROW in retried_purchases:
+                            retry_queue.add(token, FailedAction("chase_crow", land, slot))
+                        continue
+                    try:
+                        rewards = await chase_crow(client, token, slot.id)
+                        inventory.on_tool_used(ToolType.SCARECROW, rewards)
+                        state_store.log_reward(token.key, "chase_crow", rewards, slot.id)
+                        slot.action_info.is_have_crow = False
+                        crows_chased += 1
+                        land_rewards += rewards
+                        if LOG_SLOT_ACTIONS:
+                            slot_log.success(f"Ворона прогнана! Награды: {rewards}")
+                    except (Exception, PVUException) as e:
+                        unfinished.add(slot.id)
+                        inventory.on_error(e)
+                        _action_failed(
+                            retry_queue, token, FailedAction("chase_crow", land, slot), e,
+                            slot_log, "Не удалось прогнать ворону")
+            # -- Поливка
+            for slot in changed_slots:
+                if slot.action_info.is_need_water:
+                    slot_log = land_log.bind(slot=(slot.location.x, slot.location.y))
+                    await _refresh_inventory(client, token, inventory, account_log)
+                    if user.watering_tools < 1:
+                        unfinished.add(slot.id)
+                        if ToolType.WATER in retried_purchases:
+                            retry_queue.add(token, FailedAction("water_plant", land, slot))
+                        continue
+                    try:
+                        rewards = await water_plant(client, token, slot.id)
+                        inventory.on_tool_used(ToolType.WATER, rewards)
+                        state_store.log_reward(token.key, "water_plant", rewards, slot.id)
+                        slot.action_info.is_need_water = False
+                        plants_watered += 1
+                        land_rewards += rewards
+                        if LOG_SLOT_ACTIONS:
+                            slot_log.success(f"Растение полито! Награды: {rewards}")
+                    except (Exception, PVUException) as e:
+                        unfinished.add(slot.id)
+                        inventory.on_error(e)
+                        _action_failed(
+                            retry_queue, token, FailedAction("water_plant", land, slot), e,
+                            slot_log, "Не удалось полить растение")
+            # -- Прогон добрых ворон
+            for slot in changed_slots:
+                if slot.deco_effects is not None:
+                    if slot.deco_effects.is_good_crow is not None and slot.deco_effects.is_good_crow:
+                        # Добрых ворон может отгонять только владелец растения
+                        if slot.owner_id == user.public_address:
+                            slot_log = land_log.bind(slot=(slot.location.x, slot.location.y))
+                            try:
+                                rewards = await chase_good_crow(client, token, slot.id)
+                                inventory.add_reward(rewards)
+                                state_store.log_reward(token.key, "chase_good_crow", rewards, slot.id)
+                                slot.deco_effects.is_good_crow = False
+                                good_crows_chased += 1
+                                land_rewards += rewards
+                                if LOG_SLOT_ACTIONS:
+                                    slot_log.success(f"Добрая ворона прогнана! Награды: {rewards}")
+                            except (Exception, PVUException) as e:
+                                unfinished.add(slot.id)
+                                inventory.on_error(e)
+                                _action_failed(
+                                    retry_queue, token, FailedAction("chase_good_crow", land, slot), e,
+                                    slot_log, "Не удалось прогнать добрую ворону")
+            if not LOG_SLOT_ACTIONS and (crows_chased or plants_watered or good_crows_chased):
+                land_log.success(
+                    f"Ворон прогнано: {crows_chased}, растений полито: {plants_watered}"
+                    f", добрых ворон прогнано: {good_crows_chased}. Награды: {land_rewards}"
+                )
+
+            # -- Сохраняем состояние обработанных слотов
+            for slot in changed_slots:
+                if slot.id not in unfinished:
+                    state_store.update_slot(token.key, slot)
+
+            # Слоты земли изменились: при следующей проверке их нужно запросить заново
+            if crows_chased or plants_watered or good_crows_chased or unfinished:
+                invalidate_slots(client, land.location)
+
+    # -- Сбор наград
+    ready_to_harvest = job.ready_to_harvest
+    if ready_to_harvest:
+        # Земля слота берется из пары, а не по slot.land_id: id земли в слоте может не совпасть с id из my-slots
+        lands_by_slot = {slot.id: land for land, slot in ready_to_harvest}
+        with span("harvest", phase=False, plants=len(ready_to_harvest)):
+            harvested, rewards, failed = await harvest_slots(client, token, [slot for _, slot in ready_to_harvest])
+        inventory.add_reward(rewards)
+        if harvested:
+            state_store.log_reward(token.key, "harvest", rewards)
+            account_log.success(f"Награда собрана с растений: {len(harvested)}. Награды: {rewards}")
+        for slot, error in failed:
+            land = lands_by_slot[slot.id]
+            slot_log = account_log.bind(land=(land.location.x, land.location.y), slot=(slot.location.x, slot.location.y))
+            _action_failed(retry_queue, token, FailedAction("harvest", land, slot), error, slot_log, "Не удалось собрать награду")
+
+    account_log.info(
+        f"Итого:"
+        f" le={user.le_amount}"
+        f" water={user.watering_tools}"
+        f" scarecrows={user.chase_crow_tools}"
+        f" tickets={user.number_of_lottery_tickets}"
+        f" seeds={user.number_of_seeds}"
+    )
 
+    return True
 
-if not INPUT_DIR.exists():
-    INPUT_DIR.mkdir(exist_ok=True)
-    logger.info(f"Создал папку для входных данных {INPUT_DIR}")
 
+# Итоги одного запуска обработки аккаунтов
+class CycleSummary(BaseModel):
+    accounts: int = 0
+    succeeded: int = 0
+    elapsed: float = 0
+    account_latencies: list[float] = []
 
-for filepath in [PRIVATE_KEYS_TXT, TOKENS_TXT]:
-    if not filepath.exists():
-        with open(filepath, "w"):
-            pass
-        logger.info(f"Создал файл {filepath}")
+    @property
+    def failed(self) -> int:
+        return self.accounts - self.succeeded
 
+    @classmethod
+    def merge(cls, summaries: list["CycleSummary"]) -> "CycleSummary":
+        # Итоги шардов, работающих параллельно: время - по самому долгому шарду
+        return cls(
+            accounts=sum(summary.accounts for summary in summaries),
+            succeeded=sum(summary.succeeded for summary in summaries),
+            elapsed=max((summary.elapsed for summary in summaries), default=0),
+            account_latencies=[latency for summary in summaries for latency in summary.account_latencies],
+        )
+
+
+async def process_account(
+        client: PVUClient,
+        scheduler: Scheduler,
+        state_store: StateStore,
+        token: AuthToken,
+        land_ids: set[str] | None = None,
+        retry_queue: RetryQueue | None = None,
+) -> bool:
+    # Все стадии обработки одного аккаунта подряд, без конвейера
+    job = AccountJob(token, land_ids)
+    if not await fetch_account(client, scheduler, state_store, job, retry_queue):
+        return False
+    plan_account(job)
+    return await act_account(client, state_store, job, retry_queue)
+
+
+async def _run_stage(job: AccountJob, stage: str, coroutine: Awaitable[bool]) -> bool:
+    # Все участки трассировки аккаунта на его дорожке, на какой бы стадии он ни был
+    with span(stage, track=job.track, phase=False):
+        try:
+            return await coroutine
+        except (Exception, PVUException) as e:
+            # Ошибка одного аккаунта не должна прерывать обработку остальных
+            job.log.exception(f"Не удалось обработать аккаунт: {e}")
+            return False
+
+
+async def process_accounts(
+        client: PVUClient,
+        scheduler: Scheduler,
+        state_store: StateStore,
+        due_keys: list[tuple[AuthToken, str | None]],
+        concurrency: int = MAX_CONCURRENT_ACCOUNTS,
+        retry_queue: RetryQueue | None = None,
+) -> CycleSummary:
+    # Группируем земли по аккаунтам. Ключ (token, None) означает обработку всех земель аккаунта
+    land_ids_by_token: dict[AuthToken, set[str] | None] = {}
+    for token, land_id in due_keys:
+        if land_id is None:
+            land_ids_by_token[token] = None
+        elif land_ids_by_token.get(token, set()) is not None:
+            land_ids_by_token.setdefault(token, set()).add(land_id)
+
+    # Если обработка не удастся, повторим ее через минимальный интервал.
+    # При успешной обработке земли будут перепланированы по их состоянию
+    retry_time = time() + MIN_POLL_INTERVAL
+    for key in due_keys:
+        scheduler.schedule(key, retry_time)
+
+    # Конвейер: получение данных -> планирование -> действия. Пока одни аккаунты выполняют действия,
+    # для следующих уже запрашиваются земли и слоты. Очереди между стадиями ограничены:
+    # если действия не успевают, получение данных приостанавливается и память не растет
+    results: dict[AuthToken, tuple[bool, float]] = {}
+    pending = iter(land_ids_by_token.items())
+    fetched: asyncio.Queue[AccountJob | None] = asyncio.Queue(maxsize=concurrency)
+    planned: asyncio.Queue[AccountJob | None] = asyncio.Queue(maxsize=concurrency)
+
+    async def fetch_stage():
+        # Обработчики берут аккаунты из общего итератора
+        for token, land_ids in pending:
+            job = AccountJob(token, land_ids)
+            if await _run_stage(job, "fetch", fetch_account(client, scheduler, state_store, job, retry_queue)):
+                await fetched.put(job)
+            else:
+                results[token] = (False, monotonic() - job.start_time)
+
+    async def plan_stage():
+        while (job := await fetched.get()) is not None:
+            try:
+                with span("plan", track=job.track, phase=False):
+                    plan_account(job)
+            except Exception as e:
+                job.log.exception(f"Не удалось обработать аккаунт: {e}")
+                results[job.token] = (False, monotonic() - job.start_time)
+                continue
+            await planned.put(job)
+        for _ in range(concurrency):
+            await planned.put(None)
+
+    async def act_stage():
+        while (job := await planned.get()) is not None:
+            ok = await _run_stage(job, "act", act_account(client, state_store, job, retry_queue))
+            results[job.token] = (ok, monotonic() - job.start_time)
+
+    start_time = monotonic()
+    planner = asyncio.create_task(plan_stage())
+    actors = [asyncio.create_task(act_stage()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*(fetch_stage() for _ in range(concurrency)))
+        await fetched.put(None)
+        await planner
+        await asyncio.gather(*actors)
+    finally:
+        planner.cancel()
+        for actor in actors:
+            actor.cancel()
+    summary = CycleSummary(
+        accounts=len(results),
+        succeeded=sum(ok for ok, _ in results.values()),
+        elapsed=monotonic() - start_time,
+        account_latencies=[latency for _, latency in results.values()],
+    )
+    metrics.cycle_duration.set(summary.elapsed)
+    metrics.cycle_accounts.set(summary.succeeded, result="success")
+    metrics.cycle_accounts.set(summary.failed, result="failed")
+    metrics.scheduled_lands.set(len(scheduler))
+    logger.info(
+        f"Обработка завершена за {summary.elapsed:.1f} сек."
+        f" Аккаунтов: {summary.accounts}"
+        f", обработано успешно: {summary.succeeded}"
+        f", с ошибками: {summary.failed}"
+    )
+    return summary
+
+
+async def retry_account(
+        client: PVUClient,
+        state_store: StateStore,
+        retry_queue: RetryQueue,
+        token: AuthToken,
+):
+    # Повтор неудавшихся действий аккаунта адресно: без повторного получения земель, пользователя и слотов.
+    # Сначала покупки, затем действия над слотами, для которых покупались инструменты
+    account_log = logger.bind(account=retry_queue.account(token))
+    actions = retry_queue.pop_due(token)
+    purchases = [action for action in actions if action.action == "buy_tools"]
+    for action in purchases:
+        tool_name = TOOL_NAMES[action.tool_type]
+        try:
+            await buy_tools(client, token, action.tool_type, action.quantity)
+            state_store.log_purchase(token.key, action.tool_type, action.quantity)
+            metrics.action_retries.inc(action=action.action, result="success")
+            account_log.success(f"Приобретено {tool_name}: {action.quantity} (повтор)")
+        except (Exception, PVUException) as e:
+            _action_failed(retry_queue, token, action, e, account_log, f"Не удалось купить {tool_name}")
+
+    # Действия, инструменты для которых еще не куплены, ждут повтора покупки
+    pending_purchases = retry_queue.pending_purchases(token)
+    harvest: list[FailedAction] = []
+    for action in actions:
+        if action.action == "buy_tools":
+            continue
+        if action.action == "harvest":
+            harvest.append(action)
+            continue
+        func, tool_type, description = SLOT_ACTIONS[action.action]
+        land, slot = action.land, action.slot
+        slot_log = account_log.bind(land=(land.location.x, land.location.y), slot=(slot.location.x, slot.location.y))
+        if tool_type is not None and tool_type in pending_purchases:
+            action.attempts -= 1
+            retry_queue.add(token, action)
+            continue
+        try:
+            rewards = await func(client, token, slot.id)
+        except (Exception, PVUException) as e:
+            _action_failed(retry_queue, token, action, e, slot_log, f"Не удалось {description}")
+            continue
+        state_store.log_reward(token.key, action.action, rewards, slot.id)
+        invalidate_slots(client, land.location)
+        metrics.action_retries.inc(action=action.action, result="success")
+        slot_log.success(f"Удалось {description} (повтор). Награды: {rewards}")
+
+    if harvest:
+        actions_by_slot = {action.slot.id: action for action in harvest}
+        harvested, rewards, failed = await harvest_slots(client, token, [action.slot for action in harvest])
+        if harvested:
+            state_store.log_reward(token.key, "harvest", rewards)
+            metrics.action_retries.inc(len(harvested), action="harvest", result="success")
+            account_log.success(f"Награда собрана с растений: {len(harvested)} (повтор). Награды: {rewards}")
+        for slot, error in failed:
+            action = actions_by_slot[slot.id]
+            slot_log = account_log.bind(
+                land=(action.land.location.x, action.land.location.y), slot=(slot.location.x, slot.location.y))
+            _action_failed(retry_queue, token, action, error, slot_log, "Не удалось собрать награду")
+
+
+async def retry_accounts(
+        client: PVUClient,
+        state_store: StateStore,
+        retry_queue: RetryQueue,
+        tokens: list[AuthToken],
+        concurrency: int = MAX_CONCURRENT_ACCOUNTS,
+):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def retry(token: AuthToken):
+        async with semaphore:
+            try:
+                await retry_account(client, state_store, retry_queue, token)
+            except (Exception, PVUException) as e:
+                logger.bind(account=token.masked).exception(f"Не удалось повторить действия: {e}")
+
+    with span("retry", actions=len(retry_queue)):
+        await asyncio.gather(*(retry(token) for token in tokens))
+
+
+async def load_tokens(
+        client: PVUClient,
+        token_store: TokenStore,
+        known_tokens: dict[str, AuthToken],
+        shard: Shard | None = None,
+) -> dict[str, AuthToken]:
+    # Токены хранятся по ключу: адрес для приватных ключей и сам токен для токенов из файла
+    tokens: dict[str, AuthToken] = {}
+
+    # Подгружаем приватные ключи. eth_account импортируется долго, поэтому только если ключи есть
+    with open(PRIVATE_KEYS_TXT, "r") as file:
+        private_keys = [key.strip() for key in file.readlines() if key != "\n"]
+    accounts: set[LocalAccount] = set()
+    if private_keys:
+        from eth_account import Account
+
+        accounts = {Account.from_key(key) for key in private_keys}
+
+    # Подгружаем токены
+    with open(TOKENS_TXT, "r") as file:
+        for token in file.readlines():
+            token = token.strip()
+            if token == "\n":
+                continue
+            if token.startswith("bearerHeader "):
+                token = token.split()[1]
+            if shard is not None and not shard.owns(token):
+                continue
+            tokens[token] = known_tokens.get(token) or AuthToken(token)
+
+    # Берем уже известные и сохраненные токены, а по остальным приватным ключам запрашиваем новые
+    accounts_to_login: list[LocalAccount] = []
+    for account in accounts:
+        if shard is not None and not shard.owns(account.address):
+            continue
+        token = known_tokens.get(account.address) or token_store.get(account)
+        if token is None:
+            accounts_to_login.append(account)
+        else:
+            tokens[account.address] = token
+
+    if accounts_to_login:
+        with span("login", phase=False, accounts=len(accounts_to_login)):
+            results = await get_auth_tokens(client, accounts_to_login)
+        for account in accounts_to_login:
+            result = results[account.address]
+            if isinstance(result, PVUException):
+                logger.bind(account=account.address).error(f"Не удалось запросить токен авторизации: {result.msg}")
+            elif isinstance(result, BaseException):
+                logger.bind(account=account.address).error("Не удалось запросить токен авторизации: неизвестная ошибка")
+            else:
+                tokens[account.address] = AuthToken(result, account, int(time()))
+    return tokens
+
+
+def _report_trace(shard: Shard | None):
+    # Отчет о времени фаз цикла и файл трассировки (chrome://tracing, ui.perfetto.dev).
+    # Трассировка входа по приватным ключам попадает в файл ближайшего цикла
+    rows = tracer.report()
+    if rows:
+        lines = [f"  {name:<20} {calls:>6} {total:>9.2f} {p50:>7.3f} {p95:>7.3f} {maximum:>7.3f}"
+                 for name, calls, total, p50, p95, maximum in rows]
+        tail = sorted(rows, key=lambda row: row[4], reverse=True)[:3]
+        logger.info(
+            f"Время фаз цикла, сек.:"
+            f"\n  {'фаза':<20} {'вызовов':>6} {'всего':>9} {'p50':>7} {'p95':>7} {'макс.':>7}\n"
+            + "\n".join(lines)
+            + f"\nСамые долгие хвосты (p95): {', '.join(row[0] for row in tail)}"
+        )
+
+    prefix = f"shard_{shard.index}_" if shard is not None else ""
+    tracer.export(TRACE_DIR / f"{prefix}{datetime.now():%Y%m%d_%H%M%S_%f}.json")
+    tracer.clear()
+    for old_file in sorted(TRACE_DIR.glob(f"{prefix}[0-9]*.json"))[:-TRACE_FILES_KEEP]:
+        old_file.unlink()
+
+
+async def _heartbeat(shard: Shard, report: Callable[[tuple], None]):
+    # Сообщает координатору, что цикл событий шарда не завис
+    while True:
+        report(("heartbeat", shard.index, None))
+        await asyncio.sleep(SHARD_HEARTBEAT_INTERVAL)
+
+
+async def work(shard: Shard | None = None, report: Callable[[tuple], None] | None = None):
+    # В режиме шардов процесс обрабатывает только свою часть аккаунтов,
+    # хранит свое состояние отдельно и отправляет итоги циклов координатору через report
+    if shard is not None:
+        logger.info("Запуск шарда")
 
-async def work():
     # По умолчанию обрабатываются только растения, принадлежащие пользователю
     if PROCESS_ONLY_MY_PLANTS:
         logger.info(f"Обработка растений, принадлежащих пользователю")
     else:
         logger.info(f"Обработка всех растений, включая чужие")
 
-    while True:
-        tokens: set[str] = set()
+    state_dir = shard.state_dir if shard is not None else STATE_DIR
+    token_store = TokenStore(state_dir / AUTH_TOKENS_JSON.name, max_age=AUTH_TOKEN_MAX_AGE)
+    scheduler = Scheduler()
+    # Неудавшиеся действия повторяются по своим срокам из того же планировщика
+    retry_queue = RetryQueue(scheduler, ACTION_RETRIES, ACTION_RETRY_BACKOFF)
+    state_store = StateStore(state_dir / STATE_DB.name, persist_land_lists=LANDS_CACHE_PERSIST)
+    state_store.open()
+    tokens: dict[str, AuthToken] = {}
+    next_reload_time = 0.0
 
-        # Подгружаем приватные ключи
-        with open(PRIVATE_KEYS_TXT, "r") as file:
-            accounts: set[LocalAccount] = {Account.from_key(key.strip()) for key in file.readlines() if key != "\n"}
+    if METRICS_PORT is not None:
+        # Каждый шард отдает метрики на своем порту
+        await start_metrics_server(METRICS_HOST, METRICS_PORT + (shard.index if shard is not None else 0))
+    tracer.enabled = TRACING
+    heartbeat_task = None
+    if shard is not None and report is not None:
+        heartbeat_task = asyncio.create_task(_heartbeat(shard, report))
+    health_check_task = None
 
-        # Подгружаем токены
-        with open(TOKENS_TXT, "r") as file:
-            for token in file.readlines():
-                token = token.strip()
-                if token == "\n":
-                    continue
-                if token.startswith("bearerHeader "):
-                    token = token.split()[1]
-                tokens.add(token)
+    try:
+        # Одна сессия с пулом соединений на все время работы, а с прокси - по сессии на прокси
+        async with PVUClient(proxies=load_proxies()) as client:
+            if client.proxy_pool is not None:
+                health_check_task = asyncio.create_task(client.proxy_pool.run_health_checks(
+                    client.base_url, PROXY_HEALTH_CHECK_INTERVAL, REQUEST_TIMEOUT))
+            while True:
+                # Периодически перечитываем входные файлы: новые аккаунты обрабатываются сразу
+                if time() >= next_reload_time:
+                    fresh_tokens = await load_tokens(client, token_store, tokens, shard)
+                    # Шарду может не достаться ни одного аккаунта: он ждет, пока они появятся
+                    if not fresh_tokens and shard is None:
+                        logger.warning(
+                            f"Для работы скрипта требуется хотя бы один токен авторизации или приватный ключ!"
+                            f"\nКак получить токен авторизации: https://github.com/AlenKimov/pvu#о-токене-авторизации"
+                            f"\nВнесите токены авторизации в файл {TOKENS_TXT}"
+                            f"\nИли внесите приватные ключи в файл {PRIVATE_KEYS_TXT}"
+                        )
+                        break
+                    for token in fresh_tokens.values():
+                        if (token, None) not in scheduler:
+                            # Земли, сохраненные с прошлого запуска, обрабатываются в свой срок,
+                            # а список земель аккаунта обновится в обычном порядке
+                            stored_lands = state_store.lands(token.key)
+                            for land_id, next_due in stored_lands.items():
+                                scheduler.schedule((token, land_id), next_due)
+                            scheduler.schedule((token, None), time() + MAX_POLL_INTERVAL if stored_lands else time())
+                    removed_tokens = set(tokens.values()) - set(fresh_tokens.values())
+                    for key in scheduler.keys():
+                        if key[0] in removed_tokens:
+                            scheduler.discard(key)
+                    for token in removed_tokens:
+                        retry_queue.discard(token)
+                    tokens = fresh_tokens
+                    metrics.accounts.set(len(tokens))
+                    next_reload_time = time() + MAX_POLL_INTERVAL
 
-        async with aiohttp.ClientSession() as session:
-            # Запрашиваем токены по приватным ключам
-            try:
-                tokens.update({await get_auth_token(session, account) for account in accounts})
-            except PVUException as e:
-                logger.error(f" Не удалось запросить токены авторизации: {e.msg}")
-            except Exception:
-                logger.error(f"Не удалось запросить токены авторизации: неизвестная ошибка")
-            if not tokens:
-                logger.warning(
-                    f"Для работы скрипта требуется хотя бы один токен авторизации или приватный ключ!"
-                    f"\nКак получить токен авторизации: https://github.com/AlenKimov/pvu#о-токене-авторизации"
-                    f"\nВнесите токены авторизации в файл {TOKENS_TXT}"
-                    f"\nИли внесите приватные ключи в файл {PRIVATE_KEYS_TXT}"
-                )
-                break
-
-            # Обрабатываем токены
-            for token in tokens:
-                # Получаем данные о землях пользователя
-                try:
-                    lands = await get_land(session, token)
-                except PVUException as e:
-                    logger.error(
-                        f"[token={token[:4]}...{token[-4:]}]"
-                        f" Не удалось получить данные о землях пользователя: {e}"
-                    )
-                    continue
-                except Exception:
-                    logger.error(
-                        f"[token={token[:4]}...{token[-4:]}]"
-                        f" Не удалось получить данные о землях пользователя: неизвестная ошибка"
-                    )
+                due_keys = await scheduler.wait_due(timeout=max(next_reload_time - time(), 0))
+                if not due_keys:
                     continue
 
-                for land in lands:
-                    # Получаем актуальные данные о пользователе
-                    try:
-                        user = await get_user_info(session, token)
-                    except:
-                        logger.error(
-                            f"[token={token[:4]}...{token[-4:]}]"
-                            f" Не удалось получить данные о пользователе"
-                        )
+                # Повторы действий выполняются сразу и не требуют получения данных земель
+                retry_tokens = [token for token, land_id in due_keys if land_id == RETRY_KEY]
+                if retry_tokens:
+                    await retry_accounts(client, state_store, retry_queue, retry_tokens)
+                    due_keys = [key for key in due_keys if key[1] != RETRY_KEY]
+                    if not due_keys:
+                        with span("state_flush"):
+                            await state_store.flush()
                         continue
 
-                    # Получаем данные о слотах земли
-                    try:
-                        slots = await get_slots_by_location(session, token, land.location)
-                    except PVUException as e:
-                        logger.error(
-                            f"[{user.public_address}]"
-                            f" [land.x={land.location.x}, land.y={land.location.y}]"
-                            f" Не удалось получить данные о слотах (растениях): {e}"
-                        )
-                        continue
-                    except Exception:
-                        logger.error(
-                            f"[{user.public_address}]"
-                            f" [land.x={land.location.x}, land.y={land.location.y}]"
-                            f" Не удалось получить данные о слотах (растениях): неизвестная ошибка"
-                        )
-                        continue
+                summary = await process_accounts(client, scheduler, state_store, due_keys, retry_queue=retry_queue)
+                with span("state_flush"):
+                    await state_store.flush()
+                if report is not None:
+                    report(("summary", shard.index, summary.dict()))
 
-                    # По умолчанию обрабатываются только растения, принадлежащие пользователю
-                    if PROCESS_ONLY_MY_PLANTS:
-                        slots = [slot for slot in slots if slot.owner_id == user.public_address]
-
-                    # Подсчет количество ворон и требующих полива растений
-                    crow_amount = len(list(filter(lambda slot: slot.action_info.is_have_crow, slots)))
-                    need_water_amount = len(list(filter(lambda slot: slot.action_info.is_need_water, slots)))
-                    if not (crow_amount and need_water_amount):
-                        logger.info(
-                            f"[{user.public_address}]"
-                            f" [land.x={land.location.x}, land.y={land.location.y}]"
-                            f" Обработка не требуется"
-                        )
-                    else:
-                        logger.info(
-                            f"[{user.public_address}]"
-                            f" [land.x={land.location.x}, land.y={land.location.y}]"
-                            f" Ворон: {crow_amount}"
-                            f", требуют воды: {need_water_amount}"
-                        )
+                # Сохраняем токены, в том числе перевыпущенные во время обработки
+                token_store.update(list(tokens.values()))
+                token_store.save()
 
-                    # Подсчет количества инструментов к покупке
-                    chase_crow_tools_to_buy = max(crow_amount - user.chase_crow_tools, 0)
-                    watering_tools_to_buy = max(need_water_amount - user.watering_tools, 0)
+                if tracer.enabled:
+                    _report_trace(shard)
 
-                    # Проверка на то, хватает ли LE на аккаунте для покупки инструментов
-                    if (user.le_amount - (chase_crow_tools_to_buy + watering_tools_to_buy) * 10) < 0:
-                        logger.warning(f"[{user.public_address}] Не хватает LE для покупки инструментов!")
-                    else:
-                        # Покупка инструментов: пугалок и воды
-                        if chase_crow_tools_to_buy > 0:
-                            try:
-                                await buy_scarecrow(session, token, chase_crow_tools_to_buy)
-                                logger.success(
-                                    f"[{user.public_address}]"
-                                    f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                    f" Приобретено пугалок: {chase_crow_tools_to_buy}"
-                                )
-                            except PVUException as e:
-                                logger.error(
-                                    f"[{user.public_address}]"
-                                    f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                    f" Не удалось купить пугалки: {e.msg}"
-                                )
-                                continue
-                            except Exception:
-                                logger.error(
-                                    f"[{user.public_address}]"
-                                    f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                    f" Не удалось купить пугалки: неизвестная ошибка"
-                                )
-                                continue
-                        if watering_tools_to_buy > 0:
-                            try:
-                                await buy_water(session, token, watering_tools_to_buy)
-                                logger.success(
-                                    f"[{user.public_address}]"
-                                    f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                    f" Приобретено воды: {watering_tools_to_buy}"
-                                )
-                            except PVUException as e:
-                                logger.error(
-                                    f"[{user.public_address}]"
-                                    f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                    f" Не удалось купить воду: {e.msg}"
-                                )
-                                continue
-                            except Exception:
-                                logger.error(
-                                    f"[{user.public_address}]"
-                                    f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                    f" Не удалось купить воду: неизвестная ошибка"
-                                )
-                                continue
-
-                    # Перемешиваем слоты
-                    shuffle(slots)
-
-                    # Обработка слотов (растений)
-                    # -- Прогон ворон
-                    for slot in slots:
-                        if slot.action_info.is_have_crow:
-                            try:
-                                await asyncio.sleep(uniform(*PROCESS_DELAY))
-                                rewards = await chase_crow(session, token, slot.id)
-                                logger.success(
-                                    f"[{user.public_address}]"
-                                    f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                    f" [slot.x={slot.location.x}, slot.y={slot.location.y}]"
-                                    f" Ворона прогнана! Награды: {rewards}"
-                                )
-                            except PVUException as e:
-                                logger.error(
-                                    f"[{user.public_address}]"
-                                    f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                    f" [slot.x={slot.location.x}, slot.y={slot.location.y}]"
-                                    f" Не удалось прогнать ворону: {e.msg}"
-                                )
-                            except Exception:
-                                logger.error(
-                                    f"[{user.public_address}]"
-                                    f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                    f" [slot.x={slot.location.x}, slot.y={slot.location.y}]"
-                                    f" Не удалось прогнать ворону: неизвестная ошибка"
-                                )
-                    # -- Поливка
-                    for slot in slots:
-                        if slot.action_info.is_need_water:
-                            try:
-                                await asyncio.sleep(uniform(*PROCESS_DELAY))
-                                rewards = await water_plant(session, token, slot.id)
-                                logger.success(
-                                    f"[{user.public_address}]"
-                                    f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                    f" [slot.x={slot.location.x}, slot.y={slot.location.y}]"
-                                    f" Растение полито! Награды: {rewards}"
-                                )
-                            except PVUException as e:
-                                logger.error(
-                                    f"[{user.public_address}]"
-                                    f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                    f" [slot.x={slot.location.x}, slot.y={slot.location.y}]"
-                                    f" Не удалось полить растение: {e.msg}"
-                                )
-                            except Exception:
-                                logger.error(
-                                    f"[{user.public_address}]"
-                                    f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                    f" [slot.x={slot.location.x}, slot.y={slot.location.y}]"
-                                    f" Не удалось полить растение: неизвестная ошибка"
-                                )
-                    # -- Прогон добрых ворон
-                    for slot in slots:
-                        if slot.deco_effects is not None:
-                            if slot.deco_effects.is_good_crow is not None and slot.deco_effects.is_good_crow:
-                                # Добрых ворон может отгонять только владелец растения
-                                if slot.owner_id == user.public_address:
-                                    try:
-                                        await asyncio.sleep(uniform(*PROCESS_DELAY))
-                                        rewards = await chase_good_crow(session, token, slot.id)
-                                        logger.success(
-                                            f"[{user.public_address}]"
-                                            f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                            f" [slot.x={slot.location.x}, slot.y={slot.location.y}]"
-                                            f" Добрая ворона прогнана! Награды: {rewards}"
-                                        )
-                                    except PVUException as e:
-                                        logger.error(
-                                            f"[{user.public_address}]"
-                                            f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                            f" [slot.x={slot.location.x}, slot.y={slot.location.y}]"
-                                            f" Не удалось прогнать ворону: {e.msg}"
-                                        )
-                                    except Exception:
-                                        logger.error(
-                                            f"[{user.public_address}]"
-                                            f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                            f" [slot.x={slot.location.x}, slot.y={slot.location.y}]"
-                                            f" Не удалось прогнать добрую ворону: неизвестная ошибка"
-                                        )
-                    # -- Сбор наград
-                    for slot in slots:
-                        now = datetime.utcnow().replace(tzinfo=timezone.utc)
-                        if slot.harvest_time is not None and now > slot.harvest_time:
-                            # Собирать награды можно только со своих растений
-                            if slot.owner_id == user.public_address:
-                                await asyncio.sleep(uniform(*PROCESS_DELAY))
-                                try:
-                                    rewards = await harvest_plants(session, token, (slot.id, ))
-                                    logger.success(
-                                        f"[{user.public_address}]"
-                                        f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                        f" [slot.x={slot.location.x}, slot.y={slot.location.y}]"
-                                        f" Награда собрана: {rewards}"
-                                    )
-                                except PVUException as e:
-                                    logger.error(
-                                        f"[{user.public_address}]"
-                                        f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                        f" [slot.x={slot.location.x}, slot.y={slot.location.y}]"
-                                        f" Не удалось собрать награду: {e.msg}"
-                                    )
-                                except Exception:
-                                    logger.error(
-                                        f"[{user.public_address}]"
-                                        f" [land.x={land.location.x}, land.y={land.location.y}]"
-                                        f" Не удалось собрать награду: неизвестная ошибка"
-                                    )
-                else:
-                    logger.info(
-                        f"[{user.public_address}]"
-                        f" [land.x={land.location.x}, land.y={land.location.y}]"
-                        f" Итого:"
-                        f" le={user.le_amount}"
-                        f" water={user.watering_tools}"
-                        f" scarecrows={user.chase_crow_tools}"
-                        f" tickets={user.number_of_lottery_tickets}"
-                        f" seeds={user.number_of_seeds}"
-                    )
-
-        logger.info(f"Сплю {SLEEP_TIME} секунд :)")
-        sleep(SLEEP_TIME)
+                next_due = scheduler.next_due()
+                if next_due is not None:
+                    logger.info(f"Следующая обработка через {max(next_due - time(), 0):.0f} сек.")
+    finally:
+        for task in (heartbeat_task, health_check_task):
+            if task is not None:
+                task.cancel()
+        # Записываем на диск оставшиеся изменения состояния
+        state_store.close()
@@ -1,6 +1,20 @@
+import argparse
 import asyncio
 
-from bot.worker import work
+from bot.config import SHARDS, LOGGING_LEVEL, LOG_JSON
+from bot.logger import setup_logger
+from bot.coordinator import Coordinator
+from bot.worker import create_input_files, work
 
 if __name__ == '__main__':
-    asyncio.run(work())
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, default=SHARDS, help="Количество процессов-воркеров")
+    args = parser.parse_args()
+
+    setup_logger(LOGGING_LEVEL, json_file=LOG_JSON)
+    create_input_files()
+
+    if args.shards > 1:
+        Coordinator(args.shards).run()
+    else:
+        asyncio.run(work())